@@ -0,0 +1,152 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+import main
+
+#Monte Carlo balancing: plays seeded headless games for every combination of the tuning constants in a grid
+#python balance.py --grid Bats.CHANCE_TO_SPAWN=1,2,4 Demon.CHANCE=2,4 --games 200 --out balance.jsonl
+
+KNOBS = ['Bats.CHANCE_TO_SPAWN', 'Demon.CHANCE', 'Boss.CHANCE', 'Cacti.CHANCE', 'DoubleJump.CHANCE',
+         'Invincibility.CHANCE', 'Potion.CHANCE', 'ROUGHNESS', 'GRAVITY']
+
+def knobOwner(knob):
+    #'Bats.CHANCE_TO_SPAWN' lives on the Bats class, 'GRAVITY' on the module itself
+    if '.' in knob:
+        owner, name = knob.split('.')
+        return getattr(main, owner), name
+    return main, knob
+
+def getKnob(knob):
+    owner, name = knobOwner(knob)
+    return getattr(owner, name)
+
+def setKnob(knob, value):
+    owner, name = knobOwner(knob)
+    setattr(owner, name, value)
+
+DEFAULTS = {knob: getKnob(knob) for knob in KNOBS}
+
+def parseValue(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def parseGrid(specs):
+    #['Bats.CHANCE_TO_SPAWN=1,2', 'GRAVITY=2,3'] -> one settings dict per combination
+    axes = []
+    for spec in specs:
+        knob, values = spec.split('=')
+        if knob not in KNOBS:
+            raise ValueError(f'unknown knob {knob}, expected one of {", ".join(KNOBS)}')
+        axes.append([(knob, parseValue(value)) for value in values.split(',')])
+    return [dict(combination) for combination in itertools.product(*axes)]
+
+def randomPolicy(seed):
+    #mostly runs right, jumps and attacks at random; seeded so a game replays exactly
+    rng = random.Random(f'{seed}:policy')
+    direction = ['right']
+    def policy(app, tick):
+        if rng.random() < 0.05:
+            direction[0] = rng.choice(['right', 'right', 'right', 'left', None])
+        pressed = []
+        if rng.random() < 0.04:
+            pressed.append('up')
+        if rng.random() < 0.15:
+            pressed.append('space')
+        return pressed, {direction[0]} if direction[0] != None else set()
+    return policy
+
+def playGame(job):
+    #runs in a worker process, knobs are set from scratch each game because workers are reused
+    settings, seed, ticks, policy, script = job
+    for knob, value in {**DEFAULTS, **settings}.items():
+        setKnob(knob, value)
+    if policy == 'random':
+        policy = randomPolicy(seed)
+    else:
+        policy = main.scriptedPolicy(script)
+    app, played, elapsed = main.runHeadless(ticks, seed, policy=policy)
+    return {'settings': settings, 'seed': seed, 'ticks': played, 'survivalSeconds': round(app.seconds, 3),
+            'died': app.gameOver, 'score': app.player.score, 'damage': app.player.damageTaken, 'elapsed': round(elapsed, 4)}
+
+def startWorker():
+    main.TerrainPrefetcher.ENABLED = False #one process per core already, a terrain thread would only compete for it
+
+def settingsKey(settings):
+    return json.dumps(settings, sort_keys=True)
+
+def summarize(results):
+    groups = {}
+    for result in results:
+        groups.setdefault(settingsKey(result['settings']), []).append(result)
+    summary = []
+    for key, games in sorted(groups.items()):
+        survival = [game['survivalSeconds'] for game in games]
+        damage = {}
+        for game in games:
+            for source, amount in game['damage'].items():
+                damage[source] = damage.get(source, 0) + amount
+        total = sum(damage.values())
+        summary.append({'settings': json.loads(key), 'games': len(games),
+                        'deathRate': sum(game['died'] for game in games) / len(games),
+                        'survivalMean': statistics.fmean(survival), 'survivalMedian': statistics.median(survival),
+                        'survivalP10': main.percentile(survival, 0.1), 'survivalP90': main.percentile(survival, 0.9),
+                        'scoreMean': statistics.fmean(game['score'] for game in games),
+                        'damageShare': {source: amount / total for source, amount in sorted(damage.items(), key=lambda item: -item[1])} if total else {}})
+    return summary
+
+def printSummary(summary):
+    for row in summary:
+        settings = ' '.join(f'{knob}={value}' for knob, value in row['settings'].items()) or 'defaults'
+        shares = ' '.join(f'{source} {share:.0%}' for source, share in row['damageShare'].items())
+        print(f"{settings:40} games {row['games']:5}  died {row['deathRate']:5.0%}  survival mean {row['survivalMean']:7.1f}s "
+              f"median {row['survivalMedian']:7.1f}s  p10 {row['survivalP10']:7.1f}s  score {row['scoreMean']:8.1f}  damage: {shares}")
+
+def runSweep(grid, games, ticks, policy, script, workers, out, firstSeed=0):
+    jobs = [(settings, seed, ticks, policy, script) for settings in grid for seed in range(firstSeed, firstSeed + games)]
+    chunk = max(1, len(jobs) // (workers * 8)) #big enough to amortize the pipe, small enough to keep every core busy at the end
+    results = []
+    start = time.perf_counter()
+    with open(out, 'w') as file, multiprocessing.Pool(workers, initializer=startWorker) as pool:
+        for result in pool.imap_unordered(playGame, jobs, chunk):
+            results.append(result)
+            file.write(json.dumps(result) + '\n')
+            file.flush() #partial results are usable while a long sweep is still running
+    elapsed = time.perf_counter() - start
+    print(f'{len(jobs)} games on {workers} workers in {elapsed:.1f}s ({len(jobs) / max(elapsed, 1e-9):.1f} games/s), results in {out}')
+    return results
+
+def balanceMain(argv=None):
+    parser = argparse.ArgumentParser(description='Fantasy Runner 112 balancing sweeps')
+    parser.add_argument('--grid', nargs='*', default=[], help=f"knob=value,value... for any of {', '.join(KNOBS)}")
+    parser.add_argument('--games', type=int, default=50, help='seeded games per combination')
+    parser.add_argument('--first-seed', type=int, default=0, help='seed of the first game, the rest count up from it')
+    parser.add_argument('--ticks', type=int, default=main.Clock.TICK_RATE * 600, help='give up on a game after this many ticks, the default is ten minutes')
+    parser.add_argument('--policy', choices=['random', 'scripted'], default='random', help='how the simulated player picks inputs')
+    parser.add_argument('--inputs', default='', help="with --policy scripted, input like '5:up 20-60:right' or @file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--out', default='balance.jsonl', help='one JSON line per game, written as games finish')
+    parser.add_argument('--summary', default=None, help='also write the per combination summary to this JSON file')
+    args = parser.parse_args(argv)
+    script = args.inputs
+    if script.startswith('@'):
+        with open(script[1:], 'r') as file:
+            script = file.read()
+    grid = parseGrid(args.grid)
+    results = runSweep(grid, args.games, args.ticks, args.policy, script, args.workers, args.out, args.first_seed)
+    summary = summarize(results)
+    printSummary(summary)
+    if args.summary != None:
+        with open(args.summary, 'w') as file:
+            json.dump(summary, file, indent = 2)
+
+if __name__ == '__main__':
+    balanceMain(sys.argv[1:])
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import main
+
+#Headless microbenchmarks for the simulation hot paths
+#python benchmarks.py --out results.json, then python benchmarks.py --compare old.json new.json
+
+def measure(setup, run, repeat):
+    #setup builds fresh state every repeat so only run is timed
+    times = []
+    for i in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append((time.perf_counter() - start) * 1e6)
+    return {'minUs': min(times), 'medianUs': statistics.median(times), 'meanUs': statistics.fmean(times), 'repeat': repeat}
+
+def benchmarkApp(seed=0, warmup=5):
+    main.TerrainPrefetcher.ENABLED = False #time the work itself, not a worker thread sharing the interpreter
+    app = main.HeadlessApp(seed)
+    app.player.invincible = True #dense scenes would otherwise end the game during setup
+    for i in range(warmup):
+        main.simulateTick(app) #fills the terrain buffer
+    return app
+
+def populate(app, rng, bats=0, demons=0, projectiles=0):
+    for i in range(bats):
+        bat = main.spawn(main.Bats, app)
+        bat.x = rng.uniform(0, app.width)
+        bat.y = rng.uniform(0, app.height//2)
+    for i in range(demons):
+        demon = main.spawn(main.Demon, app)
+        demon.x = rng.uniform(app.width//4, app.width)
+        demon.y = rng.uniform(0, app.height//2)
+    for i in range(projectiles):
+        projectile = main.spawn(main.HeroProjectile, rng.uniform(0, app.width - 100), rng.uniform(50, app.height//2), 40, 40, app)
+        if projectile == None:
+            break #pool exhausted in --arrays mode
+
+def benchMidpointDisplacement(repeat):
+    results = []
+    for size in [33, 65, 129, 257, 1025, 4097]:
+        def setup():
+            return [random.Random(size).uniform(400, 600) for i in range(2)]
+        def run(ends):
+            heights = [0] * size
+            heights[0], heights[-1] = ends
+            main.midpointDisplacement(heights, 150, random.Random(size))
+        results.append(({'size': size}, measure(setup, run, repeat)))
+    return results
+
+def benchTerrainChunks(repeat):
+    results = []
+    for size in [32, 1024, 4096]:
+        for chunks in [1, 16, 64]:
+            run = lambda rng: main.generateTerrainChunks(500, chunks, size, 35, 200, 600, rng)
+            results.append(({'size': size, 'chunks': chunks}, measure(lambda: random.Random(size), run, repeat)))
+    return results
+
+def benchCollision(repeat):
+    results = []
+    for pairs in [100, 1000, 10000]:
+        rng = random.Random(pairs)
+        rects = [((rng.uniform(0, 1200), rng.uniform(0, 800), 40, 40), (rng.uniform(0, 1200), rng.uniform(0, 800), 40, 40)) for i in range(pairs)]
+        app = benchmarkApp()
+        objects = []
+        for i in range(pairs):
+            bat = main.Bats(app)
+            bat.x, bat.y = rects[i][0][0], rects[i][0][1]
+            objects.append(bat)
+        results.append(({'function': 'collideForRectangles', 'pairs': pairs},
+                        measure(lambda: rects, lambda rects: [main.collideForRectangles(a, b) for (a, b) in rects], repeat)))
+        results.append(({'function': 'collision', 'pairs': pairs},
+                        measure(lambda: objects, lambda objects: [main.collision(a, b) for (a, b) in zip(objects, reversed(objects))], repeat)))
+    return results
+
+def benchGroundCollision(repeat):
+    results = []
+    for objects in [10, 100, 1000]:
+        def setup():
+            app = benchmarkApp()
+            rng = random.Random(objects)
+            boxes = []
+            for i in range(objects):
+                bat = main.Bats(app)
+                bat.x = rng.uniform(0, app.width)
+                bat.y = rng.uniform(0, app.height)
+                boxes.append(bat)
+            return app, boxes
+        def run(state):
+            app, boxes = state
+            for box in boxes:
+                main.checkGroundCollision(box, app)
+        results.append(({'objects': objects}, measure(setup, run, repeat)))
+    return results
+
+def benchProjectileMovement(repeat):
+    results = []
+    for projectiles in [8, 32, 64]:
+        for enemies in [4, 16, 64]:
+            def setup():
+                main.random.seed(0)
+                app = benchmarkApp()
+                populate(app, random.Random(projectiles * 1000 + enemies), bats=enemies//2, demons=enemies - enemies//2, projectiles=projectiles)
+                return app
+            def run(app):
+                main.projectileMovement(app)
+                main.compactEntities(app)
+            results.append(({'projectiles': projectiles, 'enemies': enemies}, measure(setup, run, repeat)))
+    return results
+
+def benchTopFive(repeat):
+    results = []
+    folder = tempfile.mkdtemp()
+    for lines in [100, 10000, 300000]:
+        path = os.path.join(folder, f'scores{lines}.txt')
+        rng = random.Random(lines)
+        with open(path, 'w') as file:
+            for i in range(lines):
+                file.write(f'player{i}, {rng.randint(0, 10000)}\n')
+        def cold():
+            main.Leaderboard.BOARDS.pop(path, None) #forces the file to be read again
+            return path
+        results.append(({'lines': lines, 'cache': 'cold'}, measure(cold, main.getTopFive, repeat)))
+        main.getTopFive(path)
+        results.append(({'lines': lines, 'cache': 'warm'}, measure(lambda: path, main.getTopFive, repeat)))
+        os.remove(path)
+    os.rmdir(folder)
+    return results
+
+def benchOnStep(repeat):
+    results = []
+    for density in ['empty', 'normal', 'dense', 'crowded']:
+        counts = {'empty': (0, 0, 0), 'normal': (3, 1, 4), 'dense': (16, 4, 32), 'crowded': (64, 16, 64)}[density]
+        def setup():
+            main.random.seed(0)
+            app = benchmarkApp()
+            bats, demons, projectiles = counts
+            populate(app, random.Random(density), bats, demons, projectiles)
+            return app
+        results.append(({'density': density, 'bats': counts[0], 'demons': counts[1], 'projectiles': counts[2]},
+                        measure(setup, main.simulateTick, repeat)))
+    return results
+
+def benchSnapshot(repeat):
+    results = []
+    for density in ['empty', 'dense', 'crowded']:
+        counts = {'empty': (0, 0, 0), 'dense': (16, 4, 32), 'crowded': (64, 16, 64)}[density]
+        main.random.seed(0)
+        app = benchmarkApp()
+        populate(app, random.Random(density), *counts)
+        main.compactEntities(app)
+        data = main.takeSnapshot(app)
+        params = {'density': density, 'bytes': len(data)}
+        results.append(({'function': 'takeSnapshot', **params}, measure(lambda: app, main.takeSnapshot, repeat)))
+        results.append(({'function': 'restoreSnapshot', **params}, measure(lambda: app, lambda app: main.restoreSnapshot(app, data), repeat)))
+    return results
+
+BENCHMARKS = {
+    'midpointDisplacement': benchMidpointDisplacement,
+    'generateTerrainChunks': benchTerrainChunks,
+    'collision': benchCollision,
+    'checkGroundCollision': benchGroundCollision,
+    'projectileMovement': benchProjectileMovement,
+    'getTopFive': benchTopFive,
+    'onStep': benchOnStep, #one simulateTick, name kept so older result files still line up
+    'snapshot': benchSnapshot,
+}
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def runBenchmarks(names, repeat, arrays=False):
+    main.useEntityArrays(arrays)
+    report = {'commit': gitCommit(), 'python': platform.python_version(), 'numpy': main.loadNumpy().__version__ if main.loadNumpy() != None else None,
+              'arrays': arrays, 'repeat': repeat, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': []}
+    for name in names:
+        for params, stats in BENCHMARKS[name](repeat):
+            report['results'].append({'benchmark': name, 'params': params, **stats})
+            print(f"{name:22} {formatParams(params):45} median {stats['medianUs']:11.1f}us  min {stats['minUs']:11.1f}us")
+    return report
+
+def formatParams(params):
+    return ' '.join(f'{key}={value}' for key, value in params.items())
+
+def compareReports(oldPath, newPath):
+    with open(oldPath) as file:
+        old = json.load(file)
+    with open(newPath) as file:
+        new = json.load(file)
+    before = {(result['benchmark'], formatParams(result['params'])): result['medianUs'] for result in old['results']}
+    print(f"{'benchmark':22} {'params':45} {old['commit'] or oldPath:>12} {new['commit'] or newPath:>12}  speedup")
+    for result in new['results']:
+        key = (result['benchmark'], formatParams(result['params']))
+        if key in before:
+            print(f'{key[0]:22} {key[1]:45} {before[key]:10.1f}us {result["medianUs"]:10.1f}us  {before[key] / result["medianUs"]:6.2f}x')
+
+def benchmarkMain(argv=None):
+    parser = argparse.ArgumentParser(description='Fantasy Runner 112 benchmarks')
+    parser.add_argument('--out', default=None, help='write the results to this JSON file')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per parameter set')
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--arrays', action='store_true', help='run with the NumPy entity store')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='print two result files side by side instead of running')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compareReports(*args.compare)
+        return
+    report = runBenchmarks(args.only, args.repeat, args.arrays)
+    if args.out != None:
+        with open(args.out, 'w') as file:
+            json.dump(report, file, indent = 2)
+        print(f'results written to {args.out}')
+
+if __name__ == '__main__':
+    benchmarkMain(sys.argv[1:])
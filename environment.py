@@ -0,0 +1,224 @@
+import math
+import multiprocessing
+import os
+import random
+
+import main
+
+#Gym style environment for bots: env.reset(seed) then env.step(action) until terminated or truncated
+#Every env has its own app and world, so any number of them can share a process; arrays mode is still one setting per process
+
+ARRAYS = None #arrays mode of the envs made in this process, the first one decides
+
+class RunnerEnv:
+    #(keys pressed, keys held) for each action index
+    ACTIONS = [((), ()), ((), ('right',)), ((), ('left',)), (('up',), ()), (('space',), ()),
+               (('up',), ('right',)), (('space',), ('right',)), (('up',), ('left',)), (('space',), ('left',))]
+    ACTION_NAMES = ['noop', 'right', 'left', 'jump', 'attack', 'jump right', 'attack right', 'jump left', 'attack left']
+    NEAREST = [('bat', 3), ('demon', 2), ('enemyProjectile', 4), ('cactus', 2), ('powerup', 2)] #closest few of each kind are observed
+    TERRAIN_SAMPLES = 9 #heights every 4 columns across the screen
+    SURVIVAL_REWARD = 0.01 #per tick alive
+    KILL_REWARD = 1 #per point of score
+    DAMAGE_PENALTY = 0.01 #per point of health lost
+    SEEDS = random.Random() #seeds for reset(None), kept apart from the caller's random module
+
+    def __init__(self, maxTicks=None, arrays=False, asArray=True):
+        global ARRAYS
+        if ARRAYS != None and arrays != ARRAYS:
+            raise ValueError(f'envs in this process already use arrays={ARRAYS}, the entity store is one setting per process')
+        ARRAYS = arrays
+        main.TerrainPrefetcher.ENABLED = False #steps are already as fast as the caller asks for them, a thread would only add jitter
+        self.maxTicks = maxTicks
+        self.arrays = arrays
+        self.asArray = asArray and main.loadNumpy() != None
+        self.app = None
+        self.seed = None
+
+    def reset(self, seed=None):
+        if seed == None:
+            seed = RunnerEnv.SEEDS.randrange(2**32)
+        main.useEntityArrays(self.arrays)
+        if self.app != None:
+            self.app.world.close()
+        self.app = main.HeadlessApp(seed)
+        self.seed = self.app.seed
+        self.ticks = 0
+        return self.observation(), self.info()
+
+    def step(self, action):
+        if self.app.gameOver:
+            raise RuntimeError('step() called after the game ended, call reset()')
+        pressed, held = RunnerEnv.ACTIONS[action]
+        player = self.app.player
+        score, health = player.score, player.health
+        main.headlessTick(self.app, pressed, set(held))
+        self.ticks += 1
+        lost = max(0, health - player.health) #potions heal, that isn't negative damage
+        reward = (RunnerEnv.SURVIVAL_REWARD + RunnerEnv.KILL_REWARD * (player.score - score) - RunnerEnv.DAMAGE_PENALTY * lost)
+        terminated = self.app.gameOver
+        truncated = not terminated and self.maxTicks != None and self.ticks >= self.maxTicks
+        return self.observation(), reward, terminated, truncated, self.info()
+
+    def info(self):
+        player = self.app.player
+        return {'seed': self.seed, 'ticks': self.ticks, 'score': player.score, 'health': player.health, 'damage': dict(player.damageTaken)}
+
+    def observation(self):
+        values = observe(self.app)
+        if self.asArray:
+            return main.np.asarray(values, dtype=main.np.float32)
+        return values
+
+def observationNames():
+    #what each position in the observation means, same order as observe
+    names = ['player y', 'player yVel', 'player health', 'attack cooldown', 'jumping', 'double jump', 'jumped twice',
+             'invincible', 'frozen', 'stunned', 'boss mode']
+    names += [f'terrain {index}' for index in range(RunnerEnv.TERRAIN_SAMPLES)]
+    for kind, count in RunnerEnv.NEAREST:
+        for index in range(count):
+            names += [f'{kind} {index} present', f'{kind} {index} dx', f'{kind} {index} dy']
+    names += ['boss present', 'boss dx', 'boss dy', 'boss health', 'boss is ogre']
+    return names
+
+def nearestEntities(app, kind):
+    world = app.world
+    if kind == 'bat':
+        return world.bats
+    if kind == 'demon':
+        return world.demons
+    if kind == 'enemyProjectile':
+        return world.enemyProjectiles
+    if kind == 'cactus':
+        return world.cacti
+    return world.doubleJumps + world.invincibles + world.potions
+
+def observe(app):
+    #flat list of floats, positions are relative to the player and scaled by the window so most values sit in -1..1
+    player = app.player
+    width, height = app.width, app.height
+    values = [player.y / height, player.yVel / 20, player.health / player.maxHealth, player.attackCooldown / 30,
+              float(player.isJumping), float(player.doubleJump), float(player.jumpedTwice), float(player.invincible),
+              float(player.statusEffect == 'FROZEN'), float(player.statusEffect == 'STUNNED'), float(app.bossMode)]
+    heights = app.world.terrainHeights
+    feet = player.y + player.height
+    for index in range(RunnerEnv.TERRAIN_SAMPLES):
+        column = index * 4
+        values.append((heights[column] - feet) / height if column < len(heights) else 0.0)
+    centerX = player.x + player.width / 2
+    centerY = player.y + player.height / 2
+    for kind, count in RunnerEnv.NEAREST:
+        offsets = [((entity.x + entity.width / 2 - centerX) / width, (entity.y + entity.height / 2 - centerY) / height)
+                   for entity in nearestEntities(app, kind)]
+        offsets.sort(key=lambda offset: math.hypot(*offset))
+        for index in range(count):
+            if index < len(offsets):
+                values += [1.0, offsets[index][0], offsets[index][1]]
+            else:
+                values += [0.0, 0.0, 0.0]
+    if app.world.bosses != []:
+        boss = app.world.bosses[0]
+        values += [1.0, (boss.x + boss.width / 2 - centerX) / width, (boss.y + boss.height / 2 - centerY) / height,
+                   boss.health / 200, float(boss.type == 'ogre')]
+    else:
+        values += [0.0, 0.0, 0.0, 0.0, 0.0]
+    return values
+
+def stepOrRestart(env, action, stride):
+    #finished games restart on the seed stride after the last one
+    observation, reward, terminated, truncated, info = env.step(action)
+    if terminated or truncated:
+        info['finalObservation'] = observation
+        observation, resetInfo = env.reset(env.seed + stride)
+        info['resetSeed'] = resetInfo['seed']
+    return observation, reward, terminated, truncated, info
+
+def environmentWorker(connection, options, count):
+    #a group of RunnerEnvs stepped together in one process
+    envs = [RunnerEnv(**options) for index in range(count)]
+    stride = None
+    while True:
+        command, data = connection.recv()
+        if command == 'reset':
+            seeds, stride = data
+            connection.send([env.reset(seed) for env, seed in zip(envs, seeds)])
+        elif command == 'step':
+            connection.send([stepOrRestart(env, action, stride) for env, action in zip(envs, data)])
+        elif command == 'close':
+            connection.close()
+            return
+
+class VectorRunnerEnv:
+    #steps count games in one call, split across worker processes or all in this one with processes=0
+    #environments restart on their own when a game ends
+    def __init__(self, count, maxTicks=None, arrays=False, asArray=True, processes=None):
+        self.count = count
+        self.asArray = asArray and main.loadNumpy() != None
+        if processes == None:
+            processes = min(count, os.cpu_count() or 1)
+        self.envs = []
+        self.connections = []
+        self.processes = []
+        self.groups = []
+        self.stride = count
+        if processes == 0:
+            self.envs = [RunnerEnv(maxTicks, arrays, False) for index in range(count)]
+            return
+        options = {'maxTicks': maxTicks, 'arrays': arrays, 'asArray': False} #lists pickle faster than small arrays, stacked here instead
+        for index in range(processes):
+            group = count // processes + (1 if index < count % processes else 0)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=environmentWorker, args=(child, options, group), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+            self.groups.append(group)
+
+    def split(self, values):
+        parts = []
+        start = 0
+        for group in self.groups:
+            parts.append(values[start:start + group])
+            start += group
+        return parts
+
+    def reset(self, seed=None):
+        #environment i starts on seed + i and then on seed + i + count, seed + i + 2 * count... as its games end
+        seeds = [None if seed == None else seed + index for index in range(self.count)]
+        if self.envs != []:
+            results = [env.reset(envSeed) for env, envSeed in zip(self.envs, seeds)]
+        else:
+            for connection, part in zip(self.connections, self.split(seeds)):
+                connection.send(('reset', (part, self.stride)))
+            results = [result for connection in self.connections for result in connection.recv()]
+        observations, infos = zip(*results)
+        return self.stack(observations), list(infos)
+
+    def step(self, actions):
+        actions = [int(action) for action in actions]
+        if self.envs != []:
+            results = [stepOrRestart(env, action, self.stride) for env, action in zip(self.envs, actions)]
+        else:
+            for connection, part in zip(self.connections, self.split(actions)):
+                connection.send(('step', part))
+            results = [result for connection in self.connections for result in connection.recv()]
+        observations, rewards, terminated, truncated, infos = zip(*results)
+        return self.stack(observations), self.stack(rewards), self.stack(terminated), self.stack(truncated), list(infos)
+
+    def stack(self, values):
+        if self.asArray:
+            return main.np.asarray(values, dtype=main.np.float32 if not isinstance(values[0], bool) else bool)
+        return list(values)
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        for env in self.envs:
+            if env.app != None:
+                env.app.world.close()
+        self.envs = []
+        self.connections = []
+        self.processes = []
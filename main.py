@@ -1,8 +1,63 @@
-from cmu_graphics import *
-from cmu_graphics.shape_logic import loadImageFromStringReference #CMU Graphics Tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-from images import *
+import array
+import atexit
+import collections
+import heapq
+import marshal
 import math
+import os
+import queue
 import random
+import sys
+import threading
+import time
+
+#numpy, pillow and cmu_graphics are only imported once something needs them, so importing main for the simulation or the scores stays quick
+np = None
+NUMPY_CHECKED = False
+PILImage = None #without pillow the background layers are scaled by cmu_graphics every frame
+GRAPHICS_LOADED = False
+
+def loadNumpy():
+    global np, NUMPY_CHECKED
+    if not NUMPY_CHECKED:
+        NUMPY_CHECKED = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError: #numpy is only needed for the array entity store and very wide terrain
+            np = None
+    return np
+
+def loadGraphics():
+    #called right before the window opens
+    global PILImage, GRAPHICS_LOADED
+    if GRAPHICS_LOADED:
+        return
+    import cmu_graphics
+    from cmu_graphics.shape_logic import loadImageFromStringReference #CMU Graphics Tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
+    importNames(cmu_graphics)
+    globals()['loadImageFromStringReference'] = loadImageFromStringReference
+    try:
+        import images
+        importNames(images)
+    except ImportError:
+        pass
+    try:
+        from PIL import Image
+        PILImage = Image
+    except ImportError:
+        PILImage = None
+    GRAPHICS_LOADED = True
+
+def importNames(module):
+    #like from module import *, except names main already defines (random, angleTo, distance) are kept
+    names = getattr(module, '__all__', [name for name in dir(module) if not name.startswith('_')])
+    for name in names:
+        if name not in globals():
+            globals()[name] = getattr(module, name)
+
+def angleTo(x1, y1, x2, y2): #same convention as cmu_graphics: degrees, 0 is up, clockwise
+    return (90 - math.degrees(math.atan2(y1 - y2, x2 - x1))) % 360
 
 ####################################################################################################################################################
 ####################################################################################################################################################
@@ -10,23 +65,70 @@ import random
 ROUGHNESS = 0.7
 GRAVITY = 2
 
+#The game runs in fixed ticks no matter how often the window draws, everything per tick is tuned for TICK_RATE
+class Clock:
+    TICK_RATE = 20 #simulation ticks per second
+    FRAME_RATE = 60 #onStep calls per second from cmu_graphics
+    MAX_TICKS_PER_FRAME = 5 #after a long stall the rest of the backlog is dropped instead of fast forwarding
+VECTORIZE_ABOVE = 512 #terrain with fewer columns than this is quicker to fill in plain python than with numpy
+
 #algorithm inspired from https://nick-aschenbach.github.io/blog/2014/07/06/2d-fractal-terrain/
-def midpointDisplacement(heights, displacement):
-    displaceHelper(heights, 0, len(heights)-1, displacement)
-    
-def displaceHelper(heights, left, right, displacement):
-    global ROUGHNESS
-    #base case
-    if right - left <= 1:
-        return
-    #recursive case
-    else: 
-        mid = (left + right) // 2
-        heights[mid] = (heights[left] + heights[right]) / 2 + random.uniform(-displacement, displacement)
+#goes level by level instead of recursing, every midpoint of a level gets the same displacement like the recursion depth did
+def midpointDisplacement(heights, displacement, rng=random):
+    if len(heights) > VECTORIZE_ABOVE and loadNumpy() != None:
+        rows = np.array([heights], dtype = float)
+        displaceLevels(rows, displacement, numpyGenerator(rng))
+        heights[:] = rows[0].tolist()
+    else:
+        displaceHelper(heights, displacement, rng)
+
+def displaceHelper(heights, displacement, rng=random):
+    #explicit stack in the same order the recursion used, so the plain python numbers didn't change
+    stack = [(0, len(heights) - 1, displacement)]
+    while stack:
+        left, right, displacement = stack.pop()
+        if right - left > 1:
+            mid = (left + right) // 2
+            heights[mid] = (heights[left] + heights[right]) / 2 + rng.uniform(-displacement, displacement)
+            displacement *= ROUGHNESS
+            stack.append((mid, right, displacement))
+            stack.append((left, mid, displacement))
+
+def displaceLevels(rows, displacement, generator):
+    #rows is chunks x columns with both ends of every row already set, one level of every row is filled per loop
+    lefts = np.array([0])
+    rights = np.array([rows.shape[1] - 1])
+    while True:
+        keep = rights - lefts > 1
+        lefts, rights = lefts[keep], rights[keep]
+        if len(lefts) == 0:
+            return rows
+        mids = (lefts + rights) // 2
+        offsets = generator.uniform(-displacement, displacement, (rows.shape[0], len(mids)))
+        rows[:, mids] = (rows[:, lefts] + rows[:, rights]) / 2 + offsets
         displacement *= ROUGHNESS
-        displaceHelper(heights, left, mid, displacement)
-        displaceHelper(heights, mid, right, displacement)
-    
+        lefts, rights = np.concatenate((lefts, mids)), np.concatenate((mids, rights))
+
+def numpyGenerator(rng):
+    #seeded from the python stream so a seeded run stays reproducible
+    return np.random.default_rng(rng.getrandbits(64))
+
+def generateTerrainChunks(first, count, size, displacement, low, high, rng=random):
+    #count chunks of size new columns, each chunk starts at the height the previous one ended on
+    ends = [first] + [rng.randint(low, high) for i in range(count)]
+    if count * size > VECTORIZE_ABOVE and loadNumpy() != None:
+        rows = np.zeros((count, size + 1))
+        rows[:, 0] = ends[:-1]
+        rows[:, -1] = ends[1:]
+        displaceLevels(rows, displacement, numpyGenerator(rng))
+        return rows[:, 1:].ravel().tolist()
+    heights = []
+    for i in range(count):
+        chunk = [ends[i]] + [0] * (size - 1) + [ends[i + 1]]
+        displaceHelper(chunk, displacement, rng)
+        heights += chunk[1:]
+    return heights
+
 def distance(x1, y1, x2, y2):
     return ((x1-x2)**2 + (y1-y2)**2)**0.5
 
@@ -43,9 +145,13 @@ def collideForRectangles(rect1, rect2):
     return not (x1 + w1 < x2 or x1 > x2 + w2 or y1 + h1 < y2 or y1 > y2 + h2)
     
 def checkGroundCollision(object, app):
-    for index in range(len(Terrain.TOPS)):
-        top = Terrain.TOPS[index]
-        if collideForRectangles(top, (object.x, object.y, object.width, object.height)) == True:
+    #only look at the columns under the object instead of scanning every rectangle in app.world.tops
+    rect = (object.x, object.y, object.width, object.height)
+    first = max(0, math.floor((object.x - app.width // 33) * 33 / app.width))
+    last = min(len(app.world.tops) - 1, math.floor((object.x + object.width) * 33 / app.width) + 1)
+    for column in range(first, last + 1):
+        top = app.world.tops[column]
+        if collideForRectangles(top, rect):
             if isinstance(object, Player):
                 app.player.isJumping = False
                 app.player.jumpedTwice = False
@@ -55,12 +161,107 @@ def checkGroundCollision(object, app):
             return True
     return False
 
+#Uniform grid so collision checks only look at objects in nearby cells
+class SpatialHash:
+    def __init__(self, cellSize):
+        self.cellSize = cellSize
+        self.cells = {}
+
+    def cellsFor(self, object):
+        left = math.floor(object.x / self.cellSize)
+        right = math.floor((object.x + object.width) / self.cellSize)
+        top = math.floor(object.y / self.cellSize)
+        bottom = math.floor((object.y + object.height) / self.cellSize)
+        for cellX in range(left, right + 1):
+            for cellY in range(top, bottom + 1):
+                yield (cellX, cellY)
+
+    def insert(self, object):
+        for cell in self.cellsFor(object):
+            self.cells.setdefault(cell, []).append(object)
+
+    def remove(self, object):
+        for cell in self.cellsFor(object):
+            if object in self.cells.get(cell, []):
+                self.cells[cell].remove(object)
+
+    def query(self, object):
+        #dict keeps the candidates unique and in a repeatable order
+        candidates = {}
+        for cell in self.cellsFor(object):
+            for other in self.cells.get(cell, []):
+                candidates[id(other)] = other
+        return list(candidates.values())
+
 def checkObjectLeftOrRight(object1, object2):
     if object1.x <= object2.x:
         return 'left'
     else:
         return 'right'
 
+#Entities are only marked dead during a tick, every list is compacted once at the end of the tick
+class Lifecycle:
+    HOOKS = [] #the dead waiting for compactEntities are on app.world.pending
+
+def despawn(entity, entityList, reason, app):
+    if not entity.alive:
+        return
+    entity.alive = False
+    app.world.pending[id(entityList)] = entityList
+    for hook in Lifecycle.HOOKS:
+        hook(entity, reason, app)
+
+def compactEntities(app):
+    if EntityStore.ENABLED:
+        for store in app.world.stores.values():
+            store.compact()
+    for entityList in app.world.pending.values():
+        #swap the last entity into each dead slot, order doesn't matter
+        index = 0
+        while index < len(entityList):
+            entity = entityList[index]
+            if entity.alive:
+                index += 1
+            else:
+                entityList[index] = entityList[-1]
+                entityList.pop()
+                recycle(entity, app)
+    app.world.pending = {}
+
+def scoreKill(entity, reason, app):
+    if reason == 'killed':
+        app.player.score += 1
+
+Lifecycle.HOOKS.append(scoreKill)
+
+#Hashed timer wheel: an expiry is filed under its due tick modulo the slot count, so a tick only looks at the one slot that is due
+#entries call target.expire(name, due, app), the target checks due against its own record so a timer that was started again just falls through
+class TimerWheel:
+    SLOTS = 256
+    def __init__(self, now):
+        self.now = now
+        self.slots = [[] for i in range(TimerWheel.SLOTS)]
+
+    def schedule(self, target, name, due):
+        self.slots[due % TimerWheel.SLOTS].append((due, target, name))
+
+    def advance(self, now, app):
+        while self.now < now:
+            self.now += 1
+            slot = self.slots[self.now % TimerWheel.SLOTS]
+            if slot == []:
+                continue
+            due = [entry for entry in slot if entry[0] <= self.now]
+            slot[:] = [entry for entry in slot if entry[0] > self.now] #a lap or more away
+            for (when, target, name) in due:
+                target.expire(name, when, app)
+
+    def __len__(self):
+        return sum(len(slot) for slot in self.slots)
+
+def runTimers(app):
+    app.world.timers.advance(app.timer, app)
+
 ####################################################################################################################################################
 ####################################################################################################################################################
 
@@ -68,22 +269,168 @@ def checkObjectLeftOrRight(object1, object2):
 
 def saveScore(file, playerName, score, app):
     if app.saved == False:
-        with open(file, 'a') as file:
-            file.write(f'{playerName}, {score}\n')
+        leaderboard = getLeaderboard(file)
+        if leaderboard.loaded: #otherwise the next top() reads the whole file, so the game over tick doesn't wait on it
+            leaderboard.add(playerName, score)
+        getScoreWriter(file).submit(f'{playerName}, {score}\n', leaderboard.loaded) #written by the background thread so the frame doesn't wait on the disk
         
 def getTopFive(file):
-    namesAndScores = []
-    with open(file, 'r') as file:
-        for line in file:
-            playerName, score = line.strip().split(',')
-            namesAndScores.append((playerName, int(score)))
-            namesAndScores.sort(key=lambda x: x[1], reverse = True ) #https://docs.python.org/3/howto/sorting.html for lambda sorting
-    return namesAndScores
+    return getLeaderboard(file).top()
+
+#Keeps only the best scores in a small heap, the file is only read again when its size or modified time changes
+class Leaderboard:
+    BOARDS = {}
+    def __init__(self, file, size=5):
+        self.file = file
+        self.size = size
+        self.heap = [] #min heap of (score, -line number, name) so the worst kept score is on top
+        self.lines = 0
+        self.signature = None
+        self.loaded = False #signature is None both before the first read and while there is no file yet
+
+    def fileSignature(self):
+        try:
+            info = os.stat(self.file)
+        except FileNotFoundError:
+            return None
+        return (info.st_mtime_ns, info.st_size)
+
+    def refresh(self):
+        signature = self.fileSignature()
+        if signature != self.signature:
+            self.reload()
+            self.signature = signature
+        self.loaded = True
+
+    def reload(self):
+        self.heap = []
+        self.lines = 0
+        if not os.path.exists(self.file):
+            return
+        with open(self.file, 'r') as scoreFile:
+            for line in scoreFile:
+                if line.strip() != '':
+                    playerName, score = line.strip().split(',')
+                    self.add(playerName, int(score))
+
+    def add(self, playerName, score):
+        entry = (score, -self.lines, playerName) #earlier lines win ties, like the stable sort did
+        self.lines += 1
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def top(self):
+        self.refresh()
+        return [(playerName, score) for (score, line, playerName) in sorted(self.heap, reverse = True)]
+
+def getLeaderboard(file):
+    if file not in Leaderboard.BOARDS:
+        Leaderboard.BOARDS[file] = Leaderboard(file)
+    return Leaderboard.BOARDS[file]
+
+#Background thread that appends score lines in batches
+#flushEvery=1 writes every record, flushEvery=N waits for N records, flushMs=T also writes whatever is waiting after T ms
+class ScoreWriter:
+    WRITERS = {}
+    FLUSH_EVERY = 1
+    FLUSH_MS = None
+    CAPACITY = 1000
+    def __init__(self, file, flushEvery=1, flushMs=None, capacity=1000):
+        self.file = file
+        self.flushEvery = flushEvery
+        self.flushMs = flushMs
+        self.records = queue.Queue(maxsize=capacity)
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0
+        self.lastLatency = 0
+        self.maxLatency = 0
+        self.totalLatency = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, line, listed=True):
+        #listed says the line's score is already in the leaderboard heap
+        record = (line, listed)
+        try:
+            self.records.put_nowait(record)
+        except queue.Full: #queue is full, wait for the writer instead of losing the score
+            self.blocked += 1
+            self.records.put(record)
+
+    def run(self):
+        pending = []
+        firstPending = None
+        while True:
+            timeout = None
+            if self.flushMs != None and pending != []:
+                timeout = max(0, self.flushMs / 1000 - (time.perf_counter() - firstPending))
+            try:
+                record = self.records.get(timeout=timeout)
+            except queue.Empty:
+                record = ''
+            if record == None: #close() was called
+                self.write(pending)
+                return
+            if record != '':
+                if pending == []:
+                    firstPending = time.perf_counter()
+                pending.append(record)
+            timedOut = self.flushMs != None and pending != [] and (time.perf_counter() - firstPending) * 1000 >= self.flushMs
+            if len(pending) >= self.flushEvery or timedOut:
+                self.write(pending)
+                pending = []
+
+    def write(self, pending):
+        if pending == []:
+            return
+        leaderboard = getLeaderboard(self.file)
+        before = leaderboard.fileSignature()
+        start = time.perf_counter()
+        with open(self.file, 'a') as scoreFile:
+            scoreFile.writelines(line for (line, listed) in pending)
+            scoreFile.flush()
+            os.fsync(scoreFile.fileno())
+        latency = (time.perf_counter() - start) * 1000
+        if leaderboard.signature == before and all(listed for (line, listed) in pending): #nobody else touched the file, the heap already has these scores
+            leaderboard.signature = leaderboard.fileSignature()
+        self.written += len(pending)
+        self.batches += 1
+        self.lastLatency = latency
+        self.maxLatency = max(self.maxLatency, latency)
+        self.totalLatency += latency
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.records.put(None)
+            self.thread.join()
+
+    def stats(self):
+        return {'queueDepth': self.records.qsize(), 'written': self.written, 'batches': self.batches, 'blocked': self.blocked,
+                'lastLatencyMs': self.lastLatency, 'maxLatencyMs': self.maxLatency,
+                'averageLatencyMs': self.totalLatency / self.batches if self.batches > 0 else 0}
+
+def getScoreWriter(file):
+    if file not in ScoreWriter.WRITERS:
+        ScoreWriter.WRITERS[file] = ScoreWriter(file, ScoreWriter.FLUSH_EVERY, ScoreWriter.FLUSH_MS, ScoreWriter.CAPACITY)
+    return ScoreWriter.WRITERS[file]
+
+def closeScoreWriters():
+    for writer in ScoreWriter.WRITERS.values():
+        writer.close()
+
+atexit.register(closeScoreWriters) #drain anything still queued when a headless run ends, onAppStop does it for the window
 
 ####################################################################################################################################################
 ####################################################################################################################################################
 
 class Player:
+    EFFECTS = {'doubleJump': (5, False), 'invincible': (5, False), 'statusEffect': (2, None)} #seconds it lasts, value once it wears off
+    EFFECT_LABELS = {'doubleJump': 'DOUBLE JUMP', 'invincible': 'INVINCIBLE'}
     def __init__(self, x, y, app):
         self.health = 300
         self.maxHealth = 300
@@ -105,16 +452,19 @@ class Player:
         self.height = 50
         self.airCount = 0
         self.score = 0
-        self.doubleJumpTime = 0
-        self.invincibleTime = 0
-        self.statusEffectTime = 0
+        self.effectEnds = {} #effect: tick it wears off on, app.world.timers does the expiring
         self.doubleJump = False
         self.invincible = False
         self.statusEffect = None
+        self.damageTaken = {} #source: total health lost, read by balance.py
+        
+    def hurt(self, amount, source):
+        self.health -= amount
+        self.damageTaken[source] = self.damageTaken.get(source, 0) + amount
         
     def changeImageIndex(self, app):
         desired = 12 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond // desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % self.numImages
 
@@ -140,23 +490,17 @@ class Player:
         if self.health <= 0:
             app.gameOver = True
     
-    def doubleJumpTimer(self, app):
-        self.doubleJumpTime += 1
-        if self.doubleJumpTime >= app.stepsPerSecond * 5: #five second powerup
-            self.doubleJumpTime = 0
-            self.doubleJump = False
-
-    def invincibleTimer(self, app):
-        self.invincibleTime += 1
-        if self.invincibleTime >= app.stepsPerSecond * 5:  #five second powerup
-            self.invincibleTime = 0
-            self.invincible = False
-
-    def statusEffectTimer(self, app):
-        self.statusEffectTime += 1
-        if self.statusEffectTime >= app.stepsPerSecond * 2:  #two second status effect
-            self.statusEffectTime = 0
-            self.statusEffect = None
+    def startEffect(self, name, value, app):
+        #starting an effect that is already running starts its time over
+        setattr(self, name, value)
+        due = app.timer + Player.EFFECTS[name][0] * Clock.TICK_RATE
+        self.effectEnds[name] = due
+        app.world.timers.schedule(self, name, due)
+
+    def expire(self, name, due, app):
+        if self.effectEnds.get(name) == due:
+            del self.effectEnds[name]
+            setattr(self, name, Player.EFFECTS[name][1])
 
     def statusEffects(self):
         if self.statusEffect == 'STUNNED':
@@ -166,32 +510,75 @@ class Player:
         else:
             self.speed = 20
 
-def playerDoubleJump(app):
-    if app.player.doubleJump:
-        app.player.doubleJumpTimer(app)
-
-def playerInvincible(app):
-    if app.player.invincible:
-        app.player.invincibleTimer(app)
+def activeEffects(app):
+    #effect: (its value, seconds left), for the HUD
+    player = app.player
+    return {name: (getattr(player, name), (due - app.timer) / Clock.TICK_RATE) for name, due in player.effectEnds.items()}
 
 def playerMovement(app):
-    app.player.moving = False
     app.player.changeImageIndex(app)
     app.player.falling()
     app.player.moveVertically(app.player.yVel)
     app.player.checkHealth(app)
     app.player.attackCooldownTimer()
-    app.player.statusEffectTimer(app)
     app.player.statusEffects()
     checkGroundCollision(app.player, app)
-    playerDoubleJump(app)
-    playerInvincible(app)
     
+#Preallocated projectiles handed out and taken back instead of creating a new object for every shot
+class ProjectilePool:
+    def __init__(self, projectileClass, capacity):
+        self.capacity = capacity
+        self.free = [projectileClass.__new__(projectileClass) for i in range(capacity)]
+        for projectile in self.free:
+            projectile.active = False
+        self.inUse = 0
+        self.highWater = 0
+        self.exhausted = 0
+
+    def acquire(self):
+        if self.free == []:
+            self.exhausted += 1
+            return None
+        projectile = self.free.pop()
+        projectile.active = True
+        self.inUse += 1
+        self.highWater = max(self.highWater, self.inUse)
+        return projectile
+
+    def release(self, projectile):
+        if projectile.active:
+            projectile.active = False
+            self.inUse -= 1
+            self.free.append(projectile)
+
+    def stats(self):
+        return {'capacity': self.capacity, 'inUse': self.inUse, 'highWater': self.highWater, 'exhausted': self.exhausted}
+
+def newProjectilePools():
+    pools = {}
+    for projectileClass in [HeroProjectile, EnemyProjectile]:
+        pooledClass = EntityStore.VIEWS[projectileClass] if EntityStore.ENABLED else projectileClass
+        pools[pooledClass] = ProjectilePool(pooledClass, projectileClass.POOL_SIZE)
+    return pools
+
+def recycle(entity, app):
+    pool = app.world.pools.get(type(entity))
+    if pool != None:
+        pool.release(entity)
+
 class HeroProjectile:
-    PROJECTILES = []
+    POOL_SIZE = 64
+    __slots__ = ['x', 'y', 'prevX', 'prevY', 'width', 'height', 'direction', 'createdDuringBoss', 'imageIndex', 'active', 'alive']
     def __init__(self, x, y, width, height, app):
+        self.active = True
+        self.reset(x, y, width, height, app)
+
+    def reset(self, x, y, width, height, app):
+        self.alive = True
         self.x = x
         self.y = y
+        self.prevX = x #a reused projectile mustn't be drawn sliding in from where it last died
+        self.prevY = y
         self.width = width
         self.height = height
         self.direction = None
@@ -203,105 +590,245 @@ class HeroProjectile:
             self.direction = -1
         else:
             self.direction = 1
-        HeroProjectile.PROJECTILES.append(self)
+        app.world.heroProjectiles.append(self)
 
     def changeImageIndex(self, app):
         desired = 3 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond//desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % 3
     
 
 def projectileMovement(app):
-    for projectile in HeroProjectile.PROJECTILES:
+    if EntityStore.ENABLED:
+        projectileMovementArrays(app)
+        return
+    enemyGrid = SpatialHash(100)
+    for enemy in app.world.bats + app.world.demons:
+        if enemy.alive:
+            enemyGrid.insert(enemy)
+    for projectile in app.world.heroProjectiles:
         if projectile.createdDuringBoss == True:
             projectile.x += 30 * projectile.direction #projectiles need to be shot forward and backwards during boss fight
         else:
             projectile.x += 30 #projectiles can only be shot forward
-        for bat in Bats.BATS_LIST:
-            if collision((projectile), (bat)):
-                Bats.BATS_LIST.remove(bat)
-                del bat
-                app.player.score += 1
-        for demon in Demon.DEMON_LIST:
-            if collision((projectile), (demon)):
-                Demon.DEMON_LIST.remove(demon)
-                del demon
-                app.player.score += 1
+        for enemy in enemyGrid.query(projectile):
+            if collision((projectile), (enemy)):
+                enemyGrid.remove(enemy)
+                if isinstance(enemy, Bats):
+                    despawn(enemy, app.world.bats, 'killed', app)
+                else:
+                    despawn(enemy, app.world.demons, 'killed', app)
         checkGroundCollision(projectile, app)
         if projectile.x >= app.width or projectile.x <= 0 or projectile.y >= app.height or projectile.y <= 0:
-             HeroProjectile.PROJECTILES.remove(projectile)
-             del projectile
+             despawn(projectile, app.world.heroProjectiles, 'offscreen', app)
 
 ####################################################################################################################################################
 ####################################################################################################################################################
+#Fixed size circular buffer of column heights, scrolling only moves the start instead of shifting the list
+class TerrainBuffer:
+    def __init__(self, capacity):
+        self.values = [0] * capacity
+        self.capacity = capacity
+        self.start = 0
+        self.length = 0
+        self.offset = 0 #total number of columns scrolled off the left edge
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('terrain index out of range')
+        return self.values[(self.start + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self.values[(self.start + index) % self.capacity]
+
+    def append(self, height):
+        if self.length == self.capacity:
+            raise IndexError('terrain buffer is full')
+        self.values[(self.start + self.length) % self.capacity] = height
+        self.length += 1
+
+    def extend(self, heights):
+        for height in heights:
+            self.append(height)
+
+    def popleft(self):
+        height = self[0]
+        self.start = (self.start + 1) % self.capacity
+        self.length -= 1
+        self.offset += 1
+        return height
+
+#Top rectangles of the terrain columns, built from the heights when asked for instead of stored
+class TerrainTops:
+    def __init__(self, heights, app):
+        self.heights = heights
+        self.app = app
+
+    def __len__(self):
+        return len(self.heights)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.heights)
+        height = self.heights[index]
+        return (index * self.app.width // 33, height, self.app.width // 33, (self.app.height - height))
+
+    def __iter__(self):
+        for index in range(len(self.heights)):
+            yield self[index]
+
 class Terrain:
-    TOPS = []
-    TERRAIN_HEIGHTS = []
+    CAPACITY = 65
+    CHUNK = 32 #new columns per generated chunk
     def __init__(self):
         pass
 
+#chunk k only depends on the seed, k and the height chunk k-1 ended on, so it comes out the same on either thread
+def terrainChunk(seed, index, first, size, low, high):
+    return generateTerrainChunks(first, 1, size, 35, low, high, random.Random(f'{seed}:terrain:{index}'))
+
+def terrainChunkEnd(seed, index, low, high):
+    return random.Random(f'{seed}:terrain:{index}').randint(low, high) #first number terrainChunk draws is its last height
+
+#Worker thread that keeps finished chunks a few steps ahead of the scroll, the tick only takes them off the queue
+#if the queue is empty the tick makes the chunk itself and counts an underrun
+class TerrainPrefetcher:
+    ENABLED = True
+    AHEAD = 4 #chunks kept ready
+    def __init__(self, seed, first, size, low, high, threaded=True, ahead=4, start=0):
+        self.seed = seed
+        self.first = first
+        self.size = size
+        self.low = low
+        self.high = high
+        self.chunks = queue.Queue(maxsize=ahead)
+        self.nextChunk = start #only changed by the tick
+        self.seeks = 0
+        self.served = 0
+        self.underruns = 0
+        self.discarded = 0
+        self.closed = False
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self.run, args=(first,), daemon=True)
+            self.thread.start()
+
+    def run(self, last):
+        index = 0
+        seeks = 0
+        while not self.closed:
+            if index < self.nextChunk or seeks != self.seeks: #the tick already made these or a snapshot moved it, carry on from the next one it needs
+                seeks = self.seeks
+                index = self.nextChunk
+                last = self.first if index == 0 else terrainChunkEnd(self.seed, index - 1, self.low, self.high)
+            chunk = terrainChunk(self.seed, index, last, self.size, self.low, self.high)
+            while not self.closed:
+                try:
+                    self.chunks.put((index, chunk), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            last = chunk[-1]
+            index += 1
+
+    def take(self, first):
+        index = self.nextChunk
+        chunk = None
+        while self.thread != None and chunk == None:
+            try:
+                chunkIndex, ready = self.chunks.get_nowait()
+            except queue.Empty:
+                self.underruns += 1
+                break
+            if chunkIndex == index:
+                chunk = ready
+                self.served += 1
+            else: #made by the tick after an underrun
+                self.discarded += 1
+        if chunk == None:
+            chunk = terrainChunk(self.seed, index, first, self.size, self.low, self.high)
+        self.nextChunk = index + 1
+        return chunk
+
+    def seek(self, index):
+        #chunks already queued for other indexes get discarded by take
+        self.nextChunk = index
+        self.seeks += 1
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self.thread != None:
+                try:
+                    self.chunks.get_nowait() #a worker waiting on a full queue sees closed right away instead of after its put times out
+                except queue.Empty:
+                    pass
+                self.thread.join()
+
+    def stats(self):
+        return {'ahead': self.chunks.qsize(), 'served': self.served, 'underruns': self.underruns, 'discarded': self.discarded}
+
 class Cacti:
     CHANCE = 6
-    CACTI_LOCATIONS = []
     def __init__(self, y, app):
         self.x = app.width
         self.y = y
         self.width = 38
         self.height = 62
-        Cacti.CACTI_LOCATIONS.append(self)
+        self.alive = True
+        app.world.cacti.append(self)
 
     
-    def expiration(self):
+    def expiration(self, app):
         if self.x < 0:
-            self.CACTI_LOCATIONS.remove(self)
-            del self
+            despawn(self, app.world.cacti, 'offscreen', app)
     
     def moveCacti(self, app):
         if not app.bossMode:
             self.x -= app.width//33
     
-def generateTerrainTops(app):
-    for index in range(len(Terrain.TERRAIN_HEIGHTS)):
-            height = Terrain.TERRAIN_HEIGHTS[index]
-            rectTop = (index * app.width // 33, height, app.width // 33, (app.height - height))
-            Terrain.TOPS.append(rectTop)
-    while len(Terrain.TOPS) > 65:
-            Terrain.TOPS.pop(0)
-
 def generateInitialHeights(app): 
-    if Terrain.TERRAIN_HEIGHTS == []:
-        for i in range(65):
-            Terrain.TERRAIN_HEIGHTS.append(0)
-        randomNum1 = random.randint(2*(app.height//3), 5*(app.height//6)) #initialize first height
-        randomNum2 = random.randint(2*(app.height//3), 5*(app.height//6)) #initialize last height
-        Terrain.TERRAIN_HEIGHTS[0] = randomNum1
-        Terrain.TERRAIN_HEIGHTS[-1] = randomNum2
-        midpointDisplacement(Terrain.TERRAIN_HEIGHTS, 35) #use midpoint to fill in gaps
+    if len(app.world.terrainHeights) == 0:
+        heights = [0] * Terrain.CAPACITY
+        randomNum1 = app.rngs['terrain'].randint(2*(app.height//3), 5*(app.height//6)) #initialize first height
+        randomNum2 = app.rngs['terrain'].randint(2*(app.height//3), 5*(app.height//6)) #initialize last height
+        heights[0] = randomNum1
+        heights[-1] = randomNum2
+        midpointDisplacement(heights, 35, app.rngs['terrain']) #use midpoint to fill in gaps
+        app.world.terrainHeights.extend(heights)
+        startPrefetcher(app, heights[-1])
+
+def startPrefetcher(app, first, start=0):
+    if app.world.prefetcher != None:
+        app.world.prefetcher.close()
+    app.world.prefetcher = TerrainPrefetcher(app.seed, first, Terrain.CHUNK, (app.height//3), 5*(app.height//6),
+                                           TerrainPrefetcher.ENABLED, TerrainPrefetcher.AHEAD, start)
             
 def generateTerrainHeights(app):
     if not app.bossMode:
-        if len(Terrain.TERRAIN_HEIGHTS) > 33:
-            Terrain.TERRAIN_HEIGHTS.pop(0)
-        if len(Terrain.TERRAIN_HEIGHTS) <= 33:
-            newTerrain = [Terrain.TERRAIN_HEIGHTS[-1]]
-            for i in range(31):
-                newTerrain.append(0)
-            newTerrain[-1] = random.randint((app.height//3), 5*(app.height//6))
-            midpointDisplacement(newTerrain, 35)
-            Terrain.TERRAIN_HEIGHTS.extend(newTerrain)
+        if len(app.world.terrainHeights) > 33:
+            app.world.poppedHeight = app.world.terrainHeights.popleft()
+        if len(app.world.terrainHeights) <= 33:
+            app.world.terrainHeights.extend(app.world.prefetcher.take(app.world.terrainHeights[-1]))
 
 def generateCacti(app):
     if not app.bossMode:
-        randomNum = random.randint(0, 300)
+        randomNum = app.rngs['spawns'].randint(0, 300)
         if randomNum <= Cacti.CHANCE:
-            y = Terrain.TERRAIN_HEIGHTS[33]
+            y = app.world.terrainHeights[33]
             cacti = Cacti(y - 25, app)
-    for cactus in Cacti.CACTI_LOCATIONS:
-        cactus.expiration()
+    for cactus in app.world.cacti:
+        cactus.expiration(app)
         cactus.moveCacti(app)
         if collision(cactus, app.player):
-            app.player.health -= 20
+            app.player.hurt(20, 'cactus')
 
         
 ####################################################################################################################################################
@@ -314,19 +841,19 @@ class Enemies:
 
 class Bats(Enemies):
     CHANCE_TO_SPAWN = 2
-    BATS_LIST = []
     def __init__(self, app):
         self.x = app.width
         self.y = 40
         self.width = 40
         self.height = 40
-        self.BATS_LIST.append(self)
+        self.alive = True
+        app.world.bats.append(self)
         self.imageIndex = 0
         self.numImages = 4
 
     def changeImageIndex(self, app):
         desired = 6 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond//desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % self.numImages
 
@@ -336,39 +863,41 @@ class Bats(Enemies):
             self.y += 5
             checkGroundCollision(self, app)
 
-    def removeBats(self):
+    def removeBats(self, app):
         if self.x < 0:
-            Bats.BATS_LIST.remove(self)
-            del self
+            despawn(self, app.world.bats, 'offscreen', app)
 
 def generateBats(app):
-    if len(Bats.BATS_LIST) <= 3:
-        probability = (random.randint(1, 100))
+    if len(app.world.bats) <= 3:
+        probability = (app.rngs['spawns'].randint(1, 100))
         if probability < Bats.CHANCE_TO_SPAWN:
-            Bats(app)
+            spawn(Bats, app)
 
 def batAttack(app):
-    for bat in Bats.BATS_LIST:
+    if EntityStore.ENABLED:
+        batAttackArrays(app)
+        return
+    for bat in app.world.bats:
             bat.changeImageIndex(app)
             bat.moveBats(app)
-            bat.removeBats()
+            bat.removeBats(app)
             if collision(bat, app.player):
                 if not app.player.invincible:
-                    app.player.health -= 10
+                    app.player.hurt(10, 'bat')
 
 class Demon(Enemies):
     CHANCE = 2
-    DEMON_LIST = []
     def __init__(self, app):
         self.x = app.width
         self.y = 40
         self.width = 100
         self.height = 100
-        self.DEMON_LIST.append(self)
+        self.alive = True
+        app.world.demons.append(self)
         self.imageIndex = 0
         self.numImages = 6
         #type of projectile
-        num = random.randint(1, 3)
+        num = app.rngs['spawns'].randint(1, 3)
         if num == 1:
             self.type = 'fireball'
         elif num == 2:
@@ -378,7 +907,7 @@ class Demon(Enemies):
     
     def changeImageIndex(self, app):
         desired = 6 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond//desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % self.numImages
 
@@ -389,36 +918,40 @@ class Demon(Enemies):
         self.x += 6 * math.cos(angle)
         self.y += 6 * math.sin(angle)
         if self.type == 'fireball' or self.type == 'iceball':
-            if len(EnemyProjectile.PROJECTILES) <= 4:
-                EnemyProjectile(demonCenterX, demonCenterY, 20, 20, app.player.x + app.player.width//2, app.player.y + app.player.height//2, self.type)
+            if len(app.world.enemyProjectiles) <= 4:
+                spawn(EnemyProjectile, demonCenterX, demonCenterY, 20, 20, app.player.x + app.player.width//2, app.player.y + app.player.height//2, self.type, app)
         elif self.type == 'rock':
-            if len(EnemyProjectile.PROJECTILES) <= 0:
-                EnemyProjectile(demonCenterX, demonCenterY, 20, 20, app.player.x + app.player.width//2, app.player.y + app.player.height//2, self.type)
+            if len(app.world.enemyProjectiles) <= 0:
+                spawn(EnemyProjectile, demonCenterX, demonCenterY, 20, 20, app.player.x + app.player.width//2, app.player.y + app.player.height//2, self.type, app)
         checkGroundCollision(self, app)
 
     def removeDemon(self, app):
         if self.x < 0:
-            Demon.DEMON_LIST.remove(self)
-            del self
+            despawn(self, app.world.demons, 'offscreen', app)
  
 def generateDemons(app):
-    if len(Demon.DEMON_LIST) == 0:
-        probability = (random.randint(0, 200))
+    if len(app.world.demons) == 0:
+        probability = (app.rngs['spawns'].randint(0, 200))
         if probability <= Demon.CHANCE:
-            Demon(app)
+            spawn(Demon, app)
 
 def demonAttack(app):
-    for demon in Demon.DEMON_LIST:
+    if EntityStore.ENABLED:
+        demonAttackArrays(app)
+        return
+    for demon in app.world.demons:
         demon.changeImageIndex(app)
         demon.moveDemonAndAttack(app)
         demon.removeDemon(app)
         if collision((demon), (app.player)):
             if not app.player.invincible:
-                app.player.health -= 20
+                app.player.hurt(20, 'demon')
 
 class Boss(Enemies):
     CHANCE = 2
-    BOSSES = []
+    FIRST = 90 #seconds of play before a boss can come
+    EVERY = 45 #seconds from one boss window to the next
+    WINDOW = (3, 9) #seconds into each of those that a boss can spawn
     def __init__(self, app):
         self.xVel = 0
         self.yVel = 0
@@ -426,7 +959,7 @@ class Boss(Enemies):
         self.health = 200
         self.imageIndex = 0
         self.imageIndexType = None
-        if random.randint(0, 1) == 1:
+        if app.rngs['boss'].randint(0, 1) == 1:
             self.type = 'werewolf'
             self.numImages = 6
             self.chargeTimer = 0
@@ -442,7 +975,8 @@ class Boss(Enemies):
             self.height = 100
         self.x = app.width - self.width
         self.y = app.height//2
-        self.BOSSES.append(self)
+        self.alive = True
+        app.world.bosses.append(self)
     
     def changeImageIndex(self, app):
         #for werewolf (have two states, charging or idle)
@@ -452,7 +986,7 @@ class Boss(Enemies):
             elif 15 <= self.chargeTimer < 50:
                 self.imageIndexType = 'idle'
         desired = 6 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond//desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % self.numImages
     
@@ -462,7 +996,7 @@ class Boss(Enemies):
     def moveHorizontally(self, app):
         self.x -= 7 * self.xVel
         if collision(self, app.player) and not app.player.invincible:
-            app.player.health -= 30
+            app.player.hurt(30, self.type)
         if self.type == 'ogre':
             if self.jumped == False:
                 self.xVel = 1
@@ -503,7 +1037,7 @@ class Boss(Enemies):
             self.jumped = False
         if self.jumpTimer == 0 and 200 <= distance(bossCenterX, bossCenterY, playerCenterX, playerCenterY) <= 400:
             self.jumpTowardsPlayer()
-        for projectile in HeroProjectile.PROJECTILES:
+        for projectile in app.world.grid.query(self):
             if collision(projectile, self):
                 self.health -= 30
     
@@ -535,15 +1069,14 @@ class Boss(Enemies):
         checkGroundCollision(self, app)
         if self.chargeTimer == 0:
             self.charge(app)
-        for projectile in HeroProjectile.PROJECTILES:
+        for projectile in app.world.grid.query(self):
             if collision(projectile, self):
                 self.health -= 30
 
 #General Boss Behavior
     def removeBoss(self, app):
         if self.health < 0:
-            self.BOSSES.remove(self)
-            del self
+            despawn(self, app.world.bosses, 'defeated', app)
             app.bossMode = False
 
     def moveBossAndAttack(self, app):
@@ -558,25 +1091,39 @@ class Boss(Enemies):
         self.removeBoss(app)
 
 def bossBattle(app):
+    app.world.grid = SpatialHash(100)
+    for projectile in app.world.heroProjectiles:
+        if projectile.alive:
+            app.world.grid.insert(projectile)
     if app.bossMode:
-        for boss in Boss.BOSSES:
+        for boss in app.world.bosses:
             boss.moveBossAndAttack(app)
-    for projectile in HeroProjectile.PROJECTILES:
-        for boss in Boss.BOSSES:
+    for boss in app.world.bosses:
+        if not boss.alive:
+            continue
+        for projectile in app.world.grid.query(boss):
             if collision(projectile, boss):
-                HeroProjectile.PROJECTILES.remove(projectile)
-                del projectile
+                app.world.grid.remove(projectile)
+                despawn(projectile, app.world.heroProjectiles, 'hit', app)
 
 class EnemyProjectile():
-    PROJECTILES = []
-    def __init__(self, x, y, width, height, targetX, targetY, type):
+    POOL_SIZE = 64
+    __slots__ = ['x', 'y', 'prevX', 'prevY', 'width', 'height', 'type', 'imageIndex', 'angle', 'xVel', 'yVel', 'active', 'alive']
+    def __init__(self, x, y, width, height, targetX, targetY, type, app):
+        self.active = True
+        self.reset(x, y, width, height, targetX, targetY, type, app)
+
+    def reset(self, x, y, width, height, targetX, targetY, type, app):
+        self.alive = True
         self.x = x
         self.y = y
+        self.prevX = x
+        self.prevY = y
         self.width = width
         self.height = height
         self.type = type
         self.imageIndex = 0
-        self.PROJECTILES.append(self)
+        app.world.enemyProjectiles.append(self)
         deltaX = targetX - self.x
         deltaY = targetY - self.y
         self.angle = math.atan2(deltaY, deltaX)
@@ -585,7 +1132,7 @@ class EnemyProjectile():
     
     def changeImageIndex(self, app):
         desired = 3 #inspired by cmu graphics tips https://web2.qatar.cmu.edu/cs/15112/slides/CMUGraphicsTips.pdf
-        interval = app.stepsPerSecond//desired
+        interval = Clock.TICK_RATE // desired
         if app.timer % interval == 0:
             self.imageIndex = (self.imageIndex + 1) % 3
         
@@ -593,9 +1140,9 @@ class EnemyProjectile():
         if self.type == 'fireball':
             pass
         if self.type == 'iceball':
-            app.player.statusEffect = 'FROZEN'
+            app.player.startEffect('statusEffect', 'FROZEN', app)
         if self.type == 'rock':
-            app.player.statusEffect = 'STUNNED'
+            app.player.startEffect('statusEffect', 'STUNNED', app)
 
     def move(self):
         self.x += self.xVel
@@ -603,170 +1150,619 @@ class EnemyProjectile():
 
     def deleteSelf(self, app):
         if checkGroundCollision(self, app):
-            EnemyProjectile.PROJECTILES.remove(self)
-            del self
+            despawn(self, app.world.enemyProjectiles, 'ground', app)
     
 
 def enemyProjectileMovement(app):
-    for projectile in EnemyProjectile.PROJECTILES:
+    if EntityStore.ENABLED:
+        enemyProjectileMovementArrays(app)
+        return
+    for projectile in app.world.enemyProjectiles:
         projectile.changeImageIndex(app)
         projectile.move()
         if collision(projectile, app.player):
             if not app.player.invincible:
-                app.player.health -= 10
+                app.player.hurt(10, projectile.type)
                 projectile.statusEffect(app)
         if projectile.x < 0:
-            EnemyProjectile.PROJECTILES.remove(projectile)
-            del projectile
+            despawn(projectile, app.world.enemyProjectiles, 'offscreen', app)
+
+####################################################################################################################################################
+####################################################################################################################################################
+
+#Optional NumPy entity store: bats, demons and projectiles keep their numbers in arrays and the objects just point at a row
+class EntityStore:
+    ENABLED = False
+    VIEWS = {}
+    COLUMNS = ['x', 'y', 'xVel', 'yVel', 'width', 'height', 'imageIndex']
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.entities = []
+        self.columns = {name: np.zeros(capacity) for name in EntityStore.COLUMNS}
+        self.columns['imageIndex'] = np.zeros(capacity, dtype=int)
+
+    def column(self, name):
+        return self.columns[name][:self.count]
+
+    def reserve(self, count):
+        while count > len(self.columns['x']):
+            for name in EntityStore.COLUMNS:
+                self.columns[name] = np.concatenate([self.columns[name], np.zeros_like(self.columns[name])])
+
+    def bind(self, entity):
+        self.reserve(self.count + 1)
+        for name in EntityStore.COLUMNS:
+            self.columns[name][self.count] = 0
+        entity.store = self
+        entity.slot = self.count
+        self.entities.append(entity)
+        self.count += 1
+
+    def bindAll(self, entities):
+        #rows for a whole list at once, the caller fills in the columns
+        self.reserve(self.count + len(entities))
+        for entity in entities:
+            entity.store = self
+            entity.slot = self.count
+            self.entities.append(entity)
+            self.count += 1
+
+    def advanceImages(self, app, desired, numImages):
+        if app.timer % (Clock.TICK_RATE // desired) == 0:
+            images = self.column('imageIndex')
+            images[:] = (images + 1) % numImages
+
+    def overlaps(self, x, y, width, height):
+        #same test as collideForRectangles against every row at once
+        xs, ys = self.column('x'), self.column('y')
+        return ~((xs + self.column('width') < x) | (xs > x + width) | (ys + self.column('height') < y) | (ys > y + height))
+
+    def overlapsStore(self, other):
+        #rows are this store, columns are the other store
+        x1, y1 = self.column('x')[:, None], self.column('y')[:, None]
+        w1, h1 = self.column('width')[:, None], self.column('height')[:, None]
+        x2, y2 = other.column('x')[None, :], other.column('y')[None, :]
+        w2, h2 = other.column('width')[None, :], other.column('height')[None, :]
+        return ~((x1 + w1 < x2) | (x1 > x2 + w2) | (y1 + h1 < y2) | (y1 > y2 + h2))
+
+    def groundCollision(self, app, rows=None):
+        #checkGroundCollision for many rows: walk the few columns under each row and snap to the first one hit
+        found = np.zeros(self.count, dtype=bool)
+        if rows is None:
+            rows = np.ones(self.count, dtype=bool)
+        numColumns = len(app.world.tops)
+        if numColumns == 0 or not rows.any():
+            return found
+        heights = np.fromiter(app.world.terrainHeights, dtype=float, count=numColumns)
+        columnWidth = app.width // 33
+        xs, ys = self.column('x'), self.column('y')
+        widths, objectHeights = self.column('width'), self.column('height')
+        first = np.maximum(0, np.floor((xs - columnWidth) * 33 / app.width)).astype(int)
+        last = np.minimum(numColumns - 1, np.floor((xs + widths) * 33 / app.width).astype(int) + 1)
+        newY = ys.copy()
+        for step in range(int((last - first).max(initial=0)) + 1):
+            column = first + step
+            candidates = rows & ~found & (column <= last)
+            column = np.minimum(column, numColumns - 1)
+            columnX = column * app.width // 33
+            tops = heights[column]
+            hit = candidates & ~((columnX + columnWidth < xs) | (columnX > xs + widths) | (tops + (app.height - tops) < ys) | (tops > ys + objectHeights))
+            newY[hit] = tops[hit] - objectHeights[hit]
+            found |= hit
+        ys[:] = newY
+        return found
+
+    def despawnRows(self, mask, entityList, reason, app):
+        for slot in np.flatnonzero(mask):
+            despawn(self.entities[slot], entityList, reason, app)
+
+    def compact(self):
+        #drop every dead row in one pass at the end of the tick
+        keep = np.fromiter((entity.alive for entity in self.entities), dtype=bool, count=self.count)
+        if keep.all():
+            return
+        survivors = [entity for entity in self.entities if entity.alive]
+        for name in EntityStore.COLUMNS:
+            self.columns[name][:len(survivors)] = self.column(name)[keep]
+        for entity in self.entities:
+            if not entity.alive:
+                entity.store = None
+        for slot, entity in enumerate(survivors):
+            entity.slot = slot
+        self.entities = survivors
+        self.count = len(survivors)
+
+def storedColumn(name):
+    def getValue(self):
+        return self.store.columns[name][self.slot].item()
+    def setValue(self, value):
+        self.store.columns[name][self.slot] = value
+    return property(getValue, setValue)
+
+class StoredEntity:
+    x = storedColumn('x')
+    y = storedColumn('y')
+    xVel = storedColumn('xVel')
+    yVel = storedColumn('yVel')
+    width = storedColumn('width')
+    height = storedColumn('height')
+    imageIndex = storedColumn('imageIndex')
+
+class StoredBats(StoredEntity, Bats):
+    def __init__(self, app):
+        app.world.stores[Bats].bind(self)
+        Bats.__init__(self, app)
+
+class StoredDemon(StoredEntity, Demon):
+    def __init__(self, app):
+        app.world.stores[Demon].bind(self)
+        Demon.__init__(self, app)
+
+class StoredHeroProjectile(StoredEntity, HeroProjectile):
+    def reset(self, x, y, width, height, app):
+        app.world.stores[HeroProjectile].bind(self)
+        HeroProjectile.reset(self, x, y, width, height, app)
+        if self.createdDuringBoss:
+            self.xVel = 30 * self.direction
+        else:
+            self.xVel = 30
+
+class StoredEnemyProjectile(StoredEntity, EnemyProjectile):
+    def reset(self, x, y, width, height, targetX, targetY, type, app):
+        app.world.stores[EnemyProjectile].bind(self)
+        EnemyProjectile.reset(self, x, y, width, height, targetX, targetY, type, app)
+
+def useEntityArrays(enabled):
+    if enabled and loadNumpy() == None:
+        raise ImportError('the array entity store needs numpy')
+    EntityStore.ENABLED = enabled
+    EntityStore.VIEWS = {Bats: StoredBats, Demon: StoredDemon, HeroProjectile: StoredHeroProjectile, EnemyProjectile: StoredEnemyProjectile}
+
+def newEntityStores():
+    if EntityStore.ENABLED:
+        return {entityClass: EntityStore() for entityClass in EntityStore.VIEWS}
+    return {}
+
+def spawn(entityClass, *args):
+    if EntityStore.ENABLED:
+        entityClass = EntityStore.VIEWS[entityClass]
+    app = args[-1] #every entity takes the app last
+    pool = app.world.pools.get(entityClass)
+    if pool == None:
+        return entityClass(*args)
+    entity = pool.acquire()
+    if entity == None: #pool is used up, skip this projectile
+        return None
+    entity.reset(*args)
+    return entity
+
+def playerOverlaps(store, app):
+    player = app.player
+    touching = store.overlaps(player.x, player.y, player.width, player.height)
+    if touching.any():
+        player.hit = True
+    return touching
+
+def batAttackArrays(app):
+    store = app.world.stores[Bats]
+    if store.count == 0:
+        return
+    store.advanceImages(app, 6, 4)
+    xs = store.column('x')
+    xs -= 6
+    falling = xs < app.width
+    store.column('y')[falling] += 5
+    store.groundCollision(app, falling)
+    touching = playerOverlaps(store, app)
+    hits = int(touching.sum())
+    if hits and not app.player.invincible:
+        app.player.hurt(10 * hits, 'bat')
+    store.despawnRows(store.column('x') < 0, app.world.bats, 'offscreen', app)
+
+def demonAttackArrays(app):
+    store = app.world.stores[Demon]
+    if store.count == 0:
+        return
+    store.advanceImages(app, 6, 6)
+    xs, ys = store.column('x'), store.column('y')
+    centerX = xs + store.column('width') // 2
+    centerY = ys + store.column('height') // 2
+    targetX = app.player.x + app.player.width//2
+    targetY = app.player.y + app.player.height//2
+    for slot, (demon, demonCenterX, demonCenterY) in enumerate(zip(list(store.entities), centerX.tolist(), centerY.tolist())):
+        angle = angleTo(demonCenterX, demonCenterY, targetX, targetY) #math, not np.cos/np.sin, which can round the last bit differently
+        xs[slot] += 6 * math.cos(angle)
+        ys[slot] += 6 * math.sin(angle)
+        if demon.type == 'fireball' or demon.type == 'iceball':
+            if len(app.world.enemyProjectiles) <= 4:
+                spawn(EnemyProjectile, demonCenterX, demonCenterY, 20, 20, targetX, targetY, demon.type, app)
+        elif demon.type == 'rock':
+            if len(app.world.enemyProjectiles) <= 0:
+                spawn(EnemyProjectile, demonCenterX, demonCenterY, 20, 20, targetX, targetY, demon.type, app)
+    store.groundCollision(app)
+    touching = playerOverlaps(store, app)
+    hits = int(touching.sum())
+    if hits and not app.player.invincible:
+        app.player.hurt(20 * hits, 'demon')
+    store.despawnRows(store.column('x') < 0, app.world.demons, 'offscreen', app)
+
+def enemyProjectileMovementArrays(app):
+    store = app.world.stores[EnemyProjectile]
+    if store.count == 0:
+        return
+    store.advanceImages(app, 3, 3)
+    store.column('x')[:] += store.column('xVel')
+    store.column('y')[:] += store.column('yVel')
+    touching = playerOverlaps(store, app)
+    if not app.player.invincible:
+        for slot in np.flatnonzero(touching):
+            app.player.hurt(10, store.entities[slot].type)
+            store.entities[slot].statusEffect(app)
+    store.despawnRows(store.column('x') < 0, app.world.enemyProjectiles, 'offscreen', app)
+
+def projectileMovementArrays(app):
+    store = app.world.stores[HeroProjectile]
+    if store.count == 0:
+        return
+    store.column('x')[:] += store.column('xVel')
+    for enemyClass, enemyList in [(Bats, app.world.bats), (Demon, app.world.demons)]:
+        enemies = app.world.stores[enemyClass]
+        if enemies.count > 0:
+            hit = store.overlapsStore(enemies).any(axis=0)
+            enemies.despawnRows(hit, enemyList, 'killed', app)
+    store.groundCollision(app)
+    xs, ys = store.column('x'), store.column('y')
+    store.despawnRows((xs >= app.width) | (xs <= 0) | (ys >= app.height) | (ys <= 0), app.world.heroProjectiles, 'offscreen', app)
 
 ####################################################################################################################################################
 ####################################################################################################################################################
 
 class Collectibles:
+    LIFETIME = 3 #seconds on the ground, counting the tick it appears on
     def __init__(self, x, y, app):
         self.x = x
         self.y = y
 
+    def startExpiring(self, app):
+        self.expires = app.timer + Collectibles.LIFETIME * Clock.TICK_RATE - 1
+        app.world.timers.schedule(self, 'expired', self.expires)
+
+    def expire(self, name, due, app):
+        if self.alive and self.expires == due:
+            despawn(self, getattr(app.world, self.WORLD_LIST), 'expired', app)
+
 class DoubleJump(Collectibles):
     CHANCE = 1
-    DOUBLE_JUMP_LOCATIONS = []
-    def __init__(self, x, y):
+    WORLD_LIST = 'doubleJumps'
+    def __init__(self, x, y, app):
         self.x = x
         self.y = y
         self.width = 40
         self.height = 40
-        self.DOUBLE_JUMP_LOCATIONS.append(self)
-        self.time = 0
-
-    def expiration(self):
-        self.time += 1
+        self.alive = True
+        app.world.doubleJumps.append(self)
+        self.startExpiring(app)
 
 class Invincibility(Collectibles):
     CHANCE = 1
-    INVINCIBLE_LOCATIONS = []
-    def __init__(self, x, y):
+    WORLD_LIST = 'invincibles'
+    def __init__(self, x, y, app):
         self.x = x
         self.y = y
         self.width = 40
         self.height = 40
-        self.INVINCIBLE_LOCATIONS.append(self)
-        self.time = 0
-
-    def expiration(self):
-        self.time += 1
+        self.alive = True
+        app.world.invincibles.append(self)
+        self.startExpiring(app)
 
 class Potion(Collectibles):
     CHANCE = 1
-    POTION_LOCATIONS = []
-    def __init__(self, x, y):
+    WORLD_LIST = 'potions'
+    def __init__(self, x, y, app):
         self.x = x
         self.y = y
         self.width = 40
         self.height = 40
-        self.POTION_LOCATIONS.append(self)
-        self.time = 0
-    
-    def expiration(self):
-        self.time += 1
+        self.alive = True
+        app.world.potions.append(self)
+        self.startExpiring(app)
 
 def generateInvincibility(app):
-    if len(Invincibility.INVINCIBLE_LOCATIONS) < 1 and not app.player.invincible:
-        randomNum = random.randint(0, 600)
+    if len(app.world.invincibles) < 1 and not app.player.invincible:
+        randomNum = app.rngs['loot'].randint(0, 600)
         if randomNum <= Invincibility.CHANCE:
-            invincibility = Invincibility(app.player.x + random.uniform(-1, 1) * random.randint(200, 500), app.player.y - 20)
+            invincibility = Invincibility(app.player.x + app.rngs['loot'].uniform(-1, 1) * app.rngs['loot'].randint(200, 500), app.player.y - 20, app)
 
 def generateDoubleJumps(app):
-    if len(DoubleJump.DOUBLE_JUMP_LOCATIONS) < 1 and not app.player.doubleJump:
-        randomNum = random.randint(0, 200)
+    if len(app.world.doubleJumps) < 1 and not app.player.doubleJump:
+        randomNum = app.rngs['loot'].randint(0, 200)
         if randomNum <= DoubleJump.CHANCE:
-            doubleJump = DoubleJump(app.player.x + random.uniform(-1, 1) * random.randint(200, 500), app.player.y - 20)
+            doubleJump = DoubleJump(app.player.x + app.rngs['loot'].uniform(-1, 1) * app.rngs['loot'].randint(200, 500), app.player.y - 20, app)
 
 def generatePotions(app):
-    if len(DoubleJump.DOUBLE_JUMP_LOCATIONS) < 1 and app.player.health <= app.player.maxHealth:
-        randomNum = random.randint(0, 3000)
+    if len(app.world.doubleJumps) < 1 and app.player.health <= app.player.maxHealth:
+        randomNum = app.rngs['loot'].randint(0, 3000)
         if randomNum <= Potion.CHANCE:
-            potion = Potion(app.player.x + random.uniform(-1, 1) * random.randint(200, 500), app.player.y - 20)
+            potion = Potion(app.player.x + app.rngs['loot'].uniform(-1, 1) * app.rngs['loot'].randint(200, 500), app.player.y - 20, app)
 
-def expiration(app):
-    for doubleJump in DoubleJump.DOUBLE_JUMP_LOCATIONS:
+def collectPowerups(app):
+    #expired ones were already despawned by app.world.timers at the start of the tick
+    for doubleJump in app.world.doubleJumps:
         checkGroundCollision(doubleJump, app)
-        doubleJump.expiration()
-        if doubleJump.time >= 3*app.stepsPerSecond:
-            DoubleJump.DOUBLE_JUMP_LOCATIONS.remove(doubleJump)
-            del doubleJump
-        elif collision(doubleJump, app.player):
-            app.player.doubleJump = True
-            DoubleJump.DOUBLE_JUMP_LOCATIONS.remove(doubleJump)
-            del doubleJump
-    for invincible in Invincibility.INVINCIBLE_LOCATIONS:
+        if doubleJump.alive and collision(doubleJump, app.player):
+            app.player.startEffect('doubleJump', True, app)
+            despawn(doubleJump, app.world.doubleJumps, 'collected', app)
+    for invincible in app.world.invincibles:
         checkGroundCollision(invincible, app)
-        invincible.expiration()
-        if invincible.time >= 3*app.stepsPerSecond:
-            Invincibility.INVINCIBLE_LOCATIONS.remove(invincible)
-            del invincible
-        elif collision(invincible, app.player):
-            app.player.invincible = True
-            Invincibility.INVINCIBLE_LOCATIONS.remove(invincible)
-            del invincible
-    for potion in Potion.POTION_LOCATIONS:
+        if invincible.alive and collision(invincible, app.player):
+            app.player.startEffect('invincible', True, app)
+            despawn(invincible, app.world.invincibles, 'collected', app)
+    for potion in app.world.potions:
         checkGroundCollision(potion, app)
-        potion.expiration()
-        if potion.time >= 3*app.stepsPerSecond:
-            Potion.POTION_LOCATIONS.remove(potion)
-            del potion
-        elif collision(potion, app.player):
+        if potion.alive and collision(potion, app.player):
             app.player.health += 50
             if app.player.health >= app.player.maxHealth:
                 app.player.health = app.player.maxHealth
-            Potion.POTION_LOCATIONS.remove(potion)
-            del potion
+            despawn(potion, app.world.potions, 'collected', app)
 
 
 def generatePowerups(app):
     generateDoubleJumps(app)
     generateInvincibility(app)
     generatePotions(app)
-    expiration(app)
+    collectPowerups(app)
     
+#Everything one game simulates lives here, the classes only keep their tuning constants so a process can run any number of games
+class World:
+    def __init__(self, app):
+        self.terrainHeights = TerrainBuffer(Terrain.CAPACITY)
+        self.tops = TerrainTops(self.terrainHeights, app)
+        self.prefetcher = None
+        self.outline = [] #drawTerrain's polygon and the terrain it was made from
+        self.outlineKey = None
+        self.poppedHeight = None #the column that scrolled off last tick, drawn while the ground slides over it
+        self.cacti = []
+        self.bats = []
+        self.demons = []
+        self.heroProjectiles = []
+        self.enemyProjectiles = []
+        self.doubleJumps = []
+        self.invincibles = []
+        self.potions = []
+        self.bosses = []
+        self.grid = SpatialHash(100) #hero projectiles, rebuilt every tick by bossBattle
+        self.pending = {} #lists holding dead entities until compactEntities
+        self.stores = newEntityStores()
+        self.pools = newProjectilePools()
+        self.timers = TimerWheel(app.timer) #powerup, status effect and collectible expiries
+
+    def close(self):
+        if self.prefetcher != None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
 def resetObjects(app):
-    Terrain.TERRAIN_HEIGHTS = []
-    Terrain.TOPS = []
-    Cacti.CACTI_LOCATIONS = []
-    Bats.BATS_LIST = []
-    Demon.DEMON_LIST = []
-    HeroProjectile.PROJECTILES = []
-    EnemyProjectile.PROJECTILES = []
-    DoubleJump.DOUBLE_JUMP_LOCATIONS = []
-    Invincibility.INVINCIBLE_LOCATIONS = []
-    Boss.BOSSES = []
+    #a restart is a new world instead of clearing every list, the old one only has its prefetch thread stopped
+    if hasattr(app, 'world'):
+        app.world.close()
+    app.world = World(app)
+
+####################################################################################################################################################
+####################################################################################################################################################
+
+#Snapshots: everything a tick reads or writes packed into one bytes object with marshal, only taken between ticks
+#entities are saved as their attribute dicts and rebuilt on restore, the random streams as their raw Mersenne Twister words
+class Snapshots:
+    VERSION = 3
+    REWIND_SECONDS = 0 #history kept for rewinding, 0 keeps none
+    APP_FIELDS = ['seed', 'mode', 'scroll', 'backgroundOffsets', 'backgroundMoves', 'timer', 'terrainTimer', 'seconds', 'gameOver', 'paused', 'score', 'bossMode',
+                  'saved', 'heldKeys']
+    LISTS = [(Cacti, 'cacti'), (Bats, 'bats'), (Demon, 'demons'), (HeroProjectile, 'heroProjectiles'), (EnemyProjectile, 'enemyProjectiles'),
+             (DoubleJump, 'doubleJumps'), (Invincibility, 'invincibles'), (Potion, 'potions'), (Boss, 'bosses')]
+    FIELDS = {} #entity class: the slot names it keeps outside __dict__, array columns are saved a whole store at a time
+    SIZES = collections.deque(maxlen=1000)
+    TIMES = {'save': collections.deque(maxlen=1000), 'restore': collections.deque(maxlen=1000)}
+
+def entityFields(entityClass):
+    fields = Snapshots.FIELDS.get(entityClass)
+    if fields == None:
+        fields = []
+        for base in entityClass.__mro__:
+            fields += [name for name in getattr(base, '__slots__', []) if name not in fields]
+        if issubclass(entityClass, StoredEntity):
+            fields = [name for name in fields if name not in EntityStore.COLUMNS]
+        Snapshots.FIELDS[entityClass] = fields
+    return fields
+
+def entityState(entity):
+    state = {name: getattr(entity, name) for name in entityFields(type(entity))}
+    if hasattr(entity, '__dict__'):
+        state.update(entity.__dict__)
+        state.pop('store', None) #rebound on restore, the slot is kept so rows come back in the same order
+    return state
+
+def newEntity(entityClass, world):
+    if EntityStore.ENABLED:
+        entityClass = EntityStore.VIEWS[entityClass] if entityClass in EntityStore.VIEWS else entityClass
+    pool = world.pools.get(entityClass)
+    if pool != None:
+        return pool.acquire() #same pool size as when it was saved, so this can't run out
+    return entityClass.__new__(entityClass)
+
+def randomState(rng):
+    version, words, gauss = rng.getstate()
+    return version, array.array('I', words).tobytes(), gauss
+
+def setRandomState(rng, state):
+    version, words, gauss = state
+    rng.setstate((version, tuple(array.array('I', words)), gauss))
+
+def takeSnapshot(app):
+    start = time.perf_counter()
+    world = app.world
+    heights = world.terrainHeights
+    prefetcher = world.prefetcher
+    state = (Snapshots.VERSION,
+             [getattr(app, name) for name in Snapshots.APP_FIELDS],
+             world.bosses.index(app.boss) if app.boss in world.bosses else -1,
+             {name: randomState(rng) for name, rng in app.rngs.items()},
+             app.player.__dict__,
+             (list(heights), heights.offset, None if prefetcher == None else (prefetcher.first, prefetcher.nextChunk)),
+             EntityStore.ENABLED,
+             [[store.column(name).tobytes() for name in EntityStore.COLUMNS] for store in world.stores.values()] if EntityStore.ENABLED else None,
+             [[entityState(entity) for entity in getattr(world, name)] for (owner, name) in Snapshots.LISTS],
+             [(pool.highWater, pool.exhausted) for pool in world.pools.values()])
+    data = marshal.dumps(state)
+    Snapshots.TIMES['save'].append(time.perf_counter() - start)
+    Snapshots.SIZES.append(len(data))
+    return data
+
+def restoreTerrain(app, old, heights, offset, prefetch):
+    buffer = app.world.terrainHeights
+    buffer.values[:len(heights)] = heights #same as extend without an append per column
+    buffer.length = len(heights)
+    buffer.offset = offset
+    if prefetch != None:
+        if old.prefetcher != None and old.prefetcher.seed == app.seed and old.prefetcher.first == prefetch[0]:
+            app.world.prefetcher = old.prefetcher #same game, keep the worker thread
+            old.prefetcher = None
+            app.world.prefetcher.seek(prefetch[1])
+        else:
+            startPrefetcher(app, *prefetch)
+    old.close()
+
+def restoreSnapshot(app, data):
+    #the snapshot becomes a new world, the old one is only kept for its prefetch thread
+    start = time.perf_counter()
+    version, fields, bossIndex, rngs, player, terrain, arrays, columns, lists, pools = marshal.loads(data)
+    if version != Snapshots.VERSION:
+        raise ValueError(f'snapshot version {version}, expected {Snapshots.VERSION}')
+    for name, value in zip(Snapshots.APP_FIELDS, fields):
+        setattr(app, name, value)
+    for name, state in rngs.items():
+        setRandomState(app.rngs[name], state)
+    app.player = Player.__new__(Player)
+    app.player.__dict__.update(player)
+    if arrays != EntityStore.ENABLED:
+        useEntityArrays(arrays)
+    old = app.world
+    world = app.world = World(app)
+    restoreTerrain(app, old, *terrain)
+    restored = []
+    stored = []
+    for (owner, name), states in zip(Snapshots.LISTS, lists):
+        entities = getattr(world, name)
+        for state in states:
+            entity = newEntity(owner, world)
+            entities.append(entity)
+            restored.append((entity, state))
+            if 'slot' in state:
+                stored.append((state['slot'], owner, entity))
+    if arrays:
+        stored.sort(key=lambda item: item[0])
+        for owner, store in world.stores.items():
+            store.bindAll([entity for (slot, entityOwner, entity) in stored if entityOwner == owner])
+        for store, saved in zip(world.stores.values(), columns):
+            for name, values in zip(EntityStore.COLUMNS, saved):
+                store.column(name)[:] = np.frombuffer(values, dtype=store.columns[name].dtype)
+    for entity, state in restored:
+        for name, value in state.items():
+            if name != 'slot':
+                setattr(entity, name, value)
+    for pool, (highWater, exhausted) in zip(world.pools.values(), pools):
+        pool.highWater, pool.exhausted = highWater, exhausted
+    app.boss = world.bosses[bossIndex] if bossIndex >= 0 else None
+    for name, due in app.player.effectEnds.items(): #the wheel is rebuilt from the expiry ticks, it holds nothing else
+        world.timers.schedule(app.player, name, due)
+    for collectible in world.doubleJumps + world.invincibles + world.potions:
+        if collectible.alive:
+            world.timers.schedule(collectible, 'expired', collectible.expires)
+    Snapshots.TIMES['restore'].append(time.perf_counter() - start)
+
+#The last few seconds of snapshots, oldest dropped first
+class SnapshotRing:
+    def __init__(self, seconds, every=1):
+        self.every = every #ticks between snapshots
+        self.frames = collections.deque(maxlen=max(1, int(seconds * Clock.TICK_RATE / every)))
+
+    def record(self, app):
+        if app.timer % self.every == 0:
+            self.frames.append((app.timer, takeSnapshot(app)))
+
+    def rewind(self, app, seconds):
+        #restores the newest snapshot at least this many seconds old (or the oldest kept) and forgets the ones after it, returns the ticks undone
+        if len(self.frames) == 0:
+            return 0
+        target = app.timer - seconds * Clock.TICK_RATE
+        while len(self.frames) > 1 and self.frames[-1][0] > target:
+            self.frames.pop()
+        timer, data = self.frames[-1]
+        rewound = app.timer - timer
+        restoreSnapshot(app, data)
+        return rewound
+
+    def stats(self):
+        return {'frames': len(self.frames), 'seconds': len(self.frames) * self.every / Clock.TICK_RATE,
+                'bytes': sum(len(data) for (timer, data) in self.frames)}
+
+def snapshotStats():
+    stats = {}
+    if len(Snapshots.SIZES) > 0:
+        stats['bytes'] = {'mean': round(sum(Snapshots.SIZES) / len(Snapshots.SIZES)), 'max': max(Snapshots.SIZES)}
+    for kind, times in Snapshots.TIMES.items():
+        if len(times) > 0:
+            stats[kind + 'Us'] = {'mean': round(1e6 * sum(times) / len(times), 1), 'p99': round(1e6 * percentile(times, 0.99), 1),
+                                  'max': round(1e6 * max(times), 1)}
+    return stats
 
 ####################################################################################################################################################
 ####################################################################################################################################################
 
 def onAppStart(app):
+    preloadSprites(Sprites.PRELOAD)
     resetApp(app)
 
-def resetApp(app):
+def onAppStop(app):
+    #cmu_graphics ends the process with os._exit right after this, so the atexit handlers only run for headless games
+    closeScoreWriters()
+    if Profiler.EXPORT != None:
+        exportProfile(Profiler.EXPORT)
+
+def seedRandomStreams(app, seed=None):
+    #one seed per run, every subsystem gets its own stream so they don't shift each other's numbers
+    if seed == None:
+        seed = random.randrange(2**32)
+    app.seed = seed
+    app.rngs = {name: random.Random(f'{seed}:{name}') for name in ['terrain', 'spawns', 'loot', 'boss']}
+
+def resetApp(app, seed=None):
+    seedRandomStreams(app, seed)
     app.mode = 'start'
-    app.scroll1 = 0
-    app.scroll2 = 0
-    app.scroll3 = 0
-    app.scroll4 = 0
+    app.scroll = 0
+    app.backgroundOffsets = [0] * len(Background.LAYERS)
+    app.backgroundMoves = [(0, 0)] * len(Background.LAYERS) #(offset before the last move, tick it moved on) for drawing between moves
     app.timer = 0
     app.terrainTimer = 0
     app.seconds = 0
+    app.lastFrame = None
+    app.accumulator = 0
+    app.alpha = 1 #how far between the last two ticks to draw, 1 draws the latest tick as is
+    app.droppedTicks = 0
+    app.heldKeys = set()
+    app.interpolate = True
+    app.snapshots = SnapshotRing(Snapshots.REWIND_SECONDS) if Snapshots.REWIND_SECONDS > 0 else None
     resetObjects(app)
     app.height = 800
     app.width = 1200
     app.player = Player(40, app.height//2 * (3/2), app)
     app.nameInstructions = 'Enter Your Name'
     app.playerName = ''
-    app.stepsPerSecond = 20
+    app.stepsPerSecond = Clock.FRAME_RATE
     app.gameOver = False
     app.start = False
     app.paused = False
     app.score = 0
-    app.backgroundX = app.width
     app.backgroundY = 0
     app.gameX = app.width//2 - (app.width//6)
     app.gameY = 400
@@ -783,56 +1779,202 @@ def resetApp(app):
     app.bossMode = False
     app.boss = None
     app.saved = False
+    app.scoreFile = 'High Scores.txt'
 
 
 def timer(app):
     app.timer += 1
     app.terrainTimer += 1
-    app.seconds = (app.seconds + 1/30)
+    app.seconds = (app.seconds + 1/Clock.TICK_RATE)
     if not app.bossMode: #Parallax scrolling
-        app.scroll1 += 7
-        app.scroll2 += 7
-        app.scroll3 += 7
-        app.scroll4 += 7
-        app.scroll1 %= 10 * (app.width)
-        app.scroll2 %= 3.33 * (app.width)
-        app.scroll3 %= 2 * (app.width)
-        app.scroll4 %= app.width
-    if app.seconds > 60:
-        if 2 <= app.seconds % 30 <= 6:
-            if random.randint(1, 500) <= Boss.CHANCE: 
-                if Boss.BOSSES == []:
+        app.scroll += 7
+        moveBackground(app)
+    cycle = app.timer % (Boss.EVERY * Clock.TICK_RATE)
+    if app.timer > Boss.FIRST * Clock.TICK_RATE:
+        if Boss.WINDOW[0] * Clock.TICK_RATE <= cycle <= Boss.WINDOW[1] * Clock.TICK_RATE:
+            if app.rngs['boss'].randint(1, 500) <= Boss.CHANCE: 
+                if app.world.bosses == []:
                     app.boss = Boss(app)
-    if Boss.BOSSES != []:
+    if app.world.bosses != []:
         app.bossMode = True
                 
 
 def onStep(app):
+    #called at the display rate, runs however many fixed ticks the real time since the last frame is worth
+    if app.mode == 'game' and not app.paused and not app.gameOver:
+        now = time.perf_counter()
+        if app.lastFrame == None:
+            app.accumulator += 1 / app.stepsPerSecond
+        else:
+            app.accumulator += now - app.lastFrame
+        app.lastFrame = now
+        tickLength = 1 / Clock.TICK_RATE
+        ticks = 0
+        while app.accumulator >= tickLength and ticks < Clock.MAX_TICKS_PER_FRAME and not app.gameOver:
+            simulateTick(app)
+            app.accumulator -= tickLength
+            ticks += 1
+        if app.accumulator >= tickLength: #too far behind to catch up this frame
+            app.droppedTicks += int(app.accumulator / tickLength)
+            app.accumulator %= tickLength
+        if ticks > 0:
+            app.heldKeys = set()
+        app.alpha = app.accumulator / tickLength
+    else:
+        app.lastFrame = None #don't count menus or pauses as time to catch up on
+        app.heldKeys = set()
+        app.alpha = 1
+    if app.mode == 'game':
+        if app.gameOver and app.scoreFile != None:
+            saveScore(app.scoreFile, app.playerName, app.player.score, app)
+            app.saved = True
+
+def simulateTick(app):
     if app.mode == 'game':
         if not app.paused and not app.gameOver:
-            timer(app)
-            playerMovement(app)
-            generateInitialHeights(app)
-            generateTerrainHeights(app)
-            generateTerrainTops(app)
-            generateCacti(app)
+            if app.interpolate:
+                rememberPositions(app)
+            app.player.moving = False #set again by the held keys, then left alone so the frames drawn after this tick see it
+            if app.heldKeys:
+                applyHeldKeys(app, app.heldKeys)
+            profile('timer', timer, app)
+            profile('timers', runTimers, app)
+            profile('playerMovement', playerMovement, app)
+            profile('generateInitialHeights', generateInitialHeights, app)
+            profile('generateTerrainHeights', generateTerrainHeights, app)
+            profile('generateCacti', generateCacti, app)
             if not app.bossMode:
-                generateBats(app)
-                generateDemons(app)
-            batAttack(app)
-            demonAttack(app)
-            enemyProjectileMovement(app)
-            projectileMovement(app)
-            generatePowerups(app)
-            bossBattle(app)
-        if app.gameOver:
-            saveScore('High Scores.txt', app.playerName, app.player.score, app)
-            app.saved = True
+                profile('generateBats', generateBats, app)
+                profile('generateDemons', generateDemons, app)
+            profile('batAttack', batAttack, app)
+            profile('demonAttack', demonAttack, app)
+            profile('enemyProjectileMovement', enemyProjectileMovement, app)
+            profile('projectileMovement', projectileMovement, app)
+            profile('generatePowerups', generatePowerups, app)
+            profile('bossBattle', bossBattle, app)
+            profile('compactEntities', compactEntities, app)
+            if app.snapshots != None:
+                profile('snapshot', app.snapshots.record, app)
+
+def rememberPositions(app):
+    #where everything was at the start of the tick, frames are drawn part way between this and the end of the tick
+    for entities in [[app.player], app.world.cacti, app.world.bats, app.world.demons, app.world.heroProjectiles, app.world.enemyProjectiles,
+                     app.world.bosses, app.world.doubleJumps, app.world.invincibles, app.world.potions]:
+        for entity in entities:
+            entity.prevX = entity.x
+            entity.prevY = entity.y
+
+def drawPosition(entity, app):
+    prevX = getattr(entity, 'prevX', None)
+    if prevX == None or app.alpha >= 1:
+        return entity.x, entity.y
+    return prevX + (entity.x - prevX) * app.alpha, entity.prevY + (entity.y - entity.prevY) * app.alpha
 
 
 ####################################################################################################################################################
 ####################################################################################################################################################
 
+#Per subsystem timings, only recorded while the overlay is on or an export file was asked for
+class Profiler:
+    ENABLED = False
+    OVERLAY = False
+    EXPORT = None
+    WINDOW = 200 #ticks used for the rolling percentiles
+    SAMPLES = {} #name: the last WINDOW timings, all the overlay needs
+    ENTITIES = {}
+    HISTORY = {} #name: (every timing, every entity count), only kept while there is an export to write
+
+def profile(name, function, app):
+    if not Profiler.ENABLED:
+        return function(app)
+    start = time.perf_counter()
+    result = function(app)
+    elapsed = (time.perf_counter() - start) * 1000
+    entities = subsystemEntities(name, app)
+    if name not in Profiler.SAMPLES:
+        Profiler.SAMPLES[name] = collections.deque(maxlen=Profiler.WINDOW)
+        Profiler.ENTITIES[name] = collections.deque(maxlen=Profiler.WINDOW)
+    Profiler.SAMPLES[name].append(elapsed)
+    Profiler.ENTITIES[name].append(entities)
+    if Profiler.EXPORT != None:
+        samples, counts = Profiler.HISTORY.setdefault(name, ([], []))
+        samples.append(elapsed)
+        counts.append(entities)
+    return result
+
+def subsystemEntities(name, app):
+    name = name.lower()
+    if 'cacti' in name:
+        lists = [app.world.cacti]
+    elif 'bat' in name and 'battle' not in name:
+        lists = [app.world.bats]
+    elif 'demon' in name:
+        lists = [app.world.demons]
+    elif 'enemyprojectile' in name:
+        lists = [app.world.enemyProjectiles]
+    elif 'projectile' in name:
+        lists = [app.world.heroProjectiles]
+    elif 'powerup' in name:
+        lists = [app.world.doubleJumps, app.world.invincibles, app.world.potions]
+    elif 'boss' in name:
+        lists = [app.world.bosses, app.world.heroProjectiles]
+    elif 'terrain' in name or 'heights' in name:
+        lists = [app.world.terrainHeights]
+    else:
+        lists = [app.world.cacti, app.world.bats, app.world.demons, app.world.heroProjectiles, app.world.enemyProjectiles, app.world.bosses]
+    return sum(len(entities) for entities in lists)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def profileSummary(wholeRun=False):
+    #the last Profiler.WINDOW calls of each subsystem, or every call since the export was turned on
+    summary = {}
+    if wholeRun:
+        sources = Profiler.HISTORY
+    else:
+        sources = {name: (samples, Profiler.ENTITIES[name]) for name, samples in Profiler.SAMPLES.items()}
+    for name, (samples, entities) in sources.items():
+        summary[name] = {'calls': len(samples), 'meanMs': sum(samples) / len(samples), 'p50Ms': percentile(samples, 0.5),
+                         'p95Ms': percentile(samples, 0.95), 'p99Ms': percentile(samples, 0.99), 'maxMs': max(samples),
+                         'meanEntities': sum(entities) / len(entities)}
+    return summary
+
+def exportProfile(path):
+    import csv, json
+    summary = profileSummary(wholeRun = True)
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['subsystem', 'calls', 'meanMs', 'p50Ms', 'p95Ms', 'p99Ms', 'maxMs', 'meanEntities'])
+            for name, stats in summary.items():
+                writer.writerow([name] + list(stats.values()))
+    else:
+        with open(path, 'w') as file:
+            json.dump(summary, file, indent = 2)
+
+def enableProfiler(exportPath=None):
+    Profiler.EXPORT = exportPath
+    Profiler.ENABLED = True
+    if exportPath != None:
+        atexit.register(exportProfile, exportPath) #headless runs, the window exports from onAppStop
+
+def toggleProfilerOverlay():
+    Profiler.OVERLAY = not Profiler.OVERLAY
+    Profiler.ENABLED = Profiler.OVERLAY or Profiler.EXPORT != None
+
+def drawProfilerOverlay(app):
+    summary = profileSummary()
+    drawRect(10, 10, 420, 30 + 18 * len(summary), fill = 'black', opacity = 60)
+    drawLabel('subsystem            p50    p95    p99 ms   n', 20, 25, fill = 'white', size = 13, align = 'left', font = 'monospace')
+    for i, (name, stats) in enumerate(summary.items()):
+        line = f"{name[:20]:20} {stats['p50Ms']:6.2f} {stats['p95Ms']:6.2f} {stats['p99Ms']:6.2f} {stats['meanEntities']:5.0f}"
+        drawLabel(line, 20, 43 + 18 * i, fill = 'white', size = 13, align = 'left', font = 'monospace')
+
+####################################################################################################################################################
+####################################################################################################################################################
+
 def onMousePress(app, mouseX, mouseY):
     if app.mode == 'start':
         if app.scoreX <= mouseX <= app.scoreX + app.scoreWidth and app.scoreY <= mouseY <= app.scoreY + app.scoreHeight:
@@ -843,6 +1985,9 @@ def onMousePress(app, mouseX, mouseY):
             app.mode = 'nameEntry'
 
 def onKeyHold(app, keys):
+    app.heldKeys.update(keys) #applied once per tick, not once per frame
+
+def applyHeldKeys(app, keys):
     if not app.paused and not app.gameOver and app.player.statusEffect != 'STUNNED':
         if 'right' in keys:
             if app.player.x <= app.width:
@@ -884,6 +2029,10 @@ def onKeyPress(app, key):
         if not app.gameOver:
             if key == 'p':
                 app.paused = not app.paused
+            if key == 'o':
+                toggleProfilerOverlay()
+            if key == 'z' and app.snapshots != None: #--rewind, back one second
+                app.snapshots.rewind(app, 1)
             if not app.paused:
                 if key == 'up' and not app.player.isJumping and not app.player.hit:
                     app.player.airCount = 0
@@ -895,10 +2044,10 @@ def onKeyPress(app, key):
                     app.player.jumpedTwice = True
                     app.player.isJumping = True
                 if key == 'space' and app.player.attackCooldown == 0 and not app.player.hit:
-                    HeroProjectile(app.player.x, app.player.y, 20, 20, app)
+                    spawn(HeroProjectile, app.player.x, app.player.y, 20, 20, app)
                     app.player.attackCooldown = 30
                 if key == 'b':
-                    if Boss.BOSSES == []:
+                    if app.world.bosses == []:
                         app.boss = Boss(app)
         if app.gameOver:
             app.mode == 'scores'
@@ -911,6 +2060,79 @@ def onKeyPress(app, key):
 ####################################################################################################################################################
 ####################################################################################################################################################
 
+#Sprite cache so each image is decoded once instead of every frame
+#Animation frames as data, (kind, state, facing) -> [(sprite path, opacity)] indexed by imageIndex
+#a new animation is a new entry here instead of another if/elif chain in the draw functions
+FLICKER = [100, 90, 80, 80, 70, 50, 50, 70, 80, 80, 90, 100] #opacity of each running frame while invincible
+
+def animationFrames(pattern, count, opacities=None):
+    return [(pattern.format(i), 100 if opacities == None else opacities[i]) for i in range(count)]
+
+class Animations:
+    TABLE = {
+        ('player', 'run', 'right'): animationFrames('images/player/frame_{:02}.png', 12),
+        ('player', 'run', 'left'): animationFrames('images/player/runningLeft{:02}.png', 12),
+        ('player', 'invincible', 'right'): animationFrames('images/player/frame_{:02}.png', 12, FLICKER),
+        ('player', 'invincible', 'left'): animationFrames('images/player/runningLeft{:02}.png', 12, FLICKER),
+        ('player', 'idle', 'right'): [('images/player/idle0.png', 100)],
+        ('player', 'idle', 'left'): [('images/player/idle1.png', 100)],
+        ('ogre', 'walk', 'right'): animationFrames('images/enemies/ogre{}.png', 6),
+        ('ogre', 'walk', 'left'): animationFrames('images/enemies/ogreRight{}.png', 6),
+        ('werewolf', 'idle', 'right'): animationFrames('images/enemies/werewolfidleright{}.png', 5) + [('images/enemies/werewolfidleright4.png', 100)],
+        ('werewolf', 'idle', 'left'): animationFrames('images/enemies/werewolfidleleft{}.png', 5) + [('images/enemies/werewolfidleleft4.png', 100)],
+        ('werewolf', 'charging', 'right'): animationFrames('images/enemies/werewolfChargeRight{}.png', 5) + [('images/enemies/werewolfChargeRight4.png', 100)],
+        ('werewolf', 'charging', 'left'): animationFrames('images/enemies/werewolfChargeLeft{}.png', 5) + [('images/enemies/werewolfChargeLeft4.png', 100)],
+        ('werewolf', 'run', 'right'): animationFrames('images/enemies/werewolfleft{}.png', 6),
+        ('werewolf', 'run', 'left'): animationFrames('images/enemies/werewolfright{}.png', 6),
+        ('energyball', None, None): animationFrames('images/player/energyball{}.png', 3),
+        ('fireball', None, None): animationFrames('images/enemies/fireball{}.png', 3),
+        ('iceball', None, None): animationFrames('images/enemies/iceball{}.png', 3),
+        ('rock', None, None): animationFrames('images/enemies/rock{}.png', 3),
+        ('bat', None, None): [('images/enemies/bat1.png', 100), ('images/enemies/bat1.png', 100), ('images/enemies/bat2.png', 100), ('images/enemies/bat2.png', 100)],
+        ('demon', None, None): animationFrames('images/enemies/demon{}.png', 6),
+    }
+    SPRITES = {} #same keys with the sprites already looked up
+
+def animationFrame(kind, state, facing, index):
+    key = (kind, state, facing)
+    frames = Animations.SPRITES.get(key)
+    if frames == None:
+        frames = [(getSprite(path), opacity) for (path, opacity) in Animations.TABLE[key]]
+        Animations.SPRITES[key] = frames
+    return frames[index % len(frames)]
+
+def animationPaths():
+    paths = []
+    for frames in Animations.TABLE.values():
+        for (path, opacity) in frames:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+class Sprites:
+    IMAGES = {}
+    HITS = 0
+    MISSES = 0
+    PRELOAD = animationPaths() + ['images/background/sky.png', 'images/background/clouds.png', 'images/background/far-mountains.png',
+                                  'images/background/canyon.png', 'images/player/double-jump.png', 'images/player/invincibility.png',
+                                  'images/player/potion.png', 'images/cactus.png']
+
+def getSprite(path):
+    if path in Sprites.IMAGES:
+        Sprites.HITS += 1
+    else:
+        Sprites.MISSES += 1
+        Sprites.IMAGES[path] = loadImageFromStringReference(path)
+    return Sprites.IMAGES[path]
+
+def preloadSprites(paths):
+    for path in paths:
+        if path not in Sprites.IMAGES:
+            Sprites.IMAGES[path] = loadImageFromStringReference(path)
+
+def spriteStats():
+    return {'hits': Sprites.HITS, 'misses': Sprites.MISSES, 'loaded': len(Sprites.IMAGES)}
+
 def redrawAll(app):
     if app.mode == 'start':
         drawStart(app)
@@ -921,59 +2143,62 @@ def redrawAll(app):
     if app.mode == 'nameEntry':
         drawNameEntry(app)
     if app.mode == 'game':
-        drawBackground(app)
-        drawTerrain(app)
-        drawCacti(app)
+        profile('drawBackground', drawBackground, app)
+        profile('drawTerrain', drawTerrain, app)
+        profile('drawCacti', drawCacti, app)
         drawPlayerAttackCooldown(app)
         if not app.bossMode:
-            drawPlayer(app)
+            profile('drawPlayer', drawPlayer, app)
         else:
-            drawPlayerForBosses(app)
+            profile('drawPlayer', drawPlayerForBosses, app)
         # drawCollisionBox(app)
         drawScoreAndTimer(app)
-        drawBats(app)
-        drawDemons(app)
-        drawHeroProjectile(app)
-        drawEnemyProjectile(app)
-        drawPowerups(app)
-        drawBoss(app)
+        drawPowerupTimer(app)
+        profile('drawBats', drawBats, app)
+        profile('drawDemons', drawDemons, app)
+        profile('drawHeroProjectile', drawHeroProjectile, app)
+        profile('drawEnemyProjectile', drawEnemyProjectile, app)
+        profile('drawPowerups', drawPowerups, app)
+        profile('drawBoss', drawBoss, app)
         if app.paused:
             drawPause(app)
         if app.gameOver:
             drawGameOver(app)
+        if Profiler.OVERLAY:
+            drawProfilerOverlay(app)
 
 
 def drawStart(app):
-    drawImage(loadImageFromStringReference('images/preview.png'), 0, 0, width=app.width, height=app.height)
-    drawImage(loadImageFromStringReference('images/fantasy-runner-112.png'), app.width//2, app.height//2 - app.height//3, align = 'center')
+    drawImage(getSprite('images/preview.png'), 0, 0, width=app.width, height=app.height)
+    drawImage(getSprite('images/fantasy-runner-112.png'), app.width//2, app.height//2 - app.height//3, align = 'center')
     drawRect(app.gameX, app.gameY, app.gameWidth, app.gameHeight, fill = 'white', border = 'black')
-    drawImage(loadImageFromStringReference('images/startLabel.png'), app.gameX + app.gameWidth//2, app.gameY + app.gameHeight//2, align = 'center')
+    drawImage(getSprite('images/startLabel.png'), app.gameX + app.gameWidth//2, app.gameY + app.gameHeight//2, align = 'center')
     drawRect(app.scoreX, app.scoreY, app.scoreWidth, app.scoreHeight, fill = 'white', border = 'black')
-    drawImage(loadImageFromStringReference('images/scores.png'), app.scoreX + app.scoreWidth//2, app.scoreY + app.scoreHeight//2, align = 'center')
+    drawImage(getSprite('images/scores.png'), app.scoreX + app.scoreWidth//2, app.scoreY + app.scoreHeight//2, align = 'center')
     drawRect(app.instructionsX, app.instructionsY, app.instructionsWidth, app.instructionsHeight, fill = 'white', border = 'black')
-    drawImage(loadImageFromStringReference('images/instructionsLabel.png'), app.instructionsX + app.instructionsWidth//2, app.instructionsY + app.instructionsHeight//2, align = 'center')
+    drawImage(getSprite('images/instructionsLabel.png'), app.instructionsX + app.instructionsWidth//2, app.instructionsY + app.instructionsHeight//2, align = 'center')
 
 def drawScoresScreen(app):
     fileName = 'High Scores.txt'
     topFive = getTopFive(fileName)
-    drawImage(loadImageFromStringReference('images/preview.png'), 0, 0, width=app.width, height=app.height)
+    drawImage(getSprite('images/preview.png'), 0, 0, width=app.width, height=app.height)
     drawRect(app.width//2, app.height//2, app.width//2, 8* (app.height//10), fill = 'white', border = 'black', align = 'center')
-    for i in range(5):
+    for i in range(len(topFive)):
         name, score = topFive[i]
         drawLabel(name, app.width//2 - 100, 150 + (i * 100), font = 'caveat', size = 50)
         drawLabel(score, app.width//2 + 100, 150 + (i * 100), font = 'caveat', size = 50)
 
 def drawInstructions(app):
-    drawImage(loadImageFromStringReference('images/preview.png'), 0, 0, width=app.width, height=app.height)
+    drawImage(getSprite('images/preview.png'), 0, 0, width=app.width, height=app.height)
     drawRect(app.width//2, app.height//2, app.width//2, app.height//2, align = 'center', fill = 'white', border = 'black')
-    drawImage(loadImageFromStringReference('images/instructions (1).png'), app.width//2, app.height//2,  align = 'center')
-    drawImage(loadImageFromStringReference('images/instructions (2).png'), app.width//2, app.height//2 - 50,  align = 'center')
-    drawImage(loadImageFromStringReference('images/instructions (3).png'), app.width//2, app.height//2 - 100,  align = 'center')
-    drawImage(loadImageFromStringReference('images/instructions (4).png'), app.width//2, app.height//2 + 50,  align = 'center', height=45, width=app.width//2-50)
-    drawImage(loadImageFromStringReference('images/instructions (5).png'), app.width//2, app.height//2 + 100,  align = 'center', height=45, width=app.width//2-50)
+    drawImage(getSprite('images/instructions (1).png'), app.width//2, app.height//2,  align = 'center')
+    drawImage(getSprite('images/instructions (2).png'), app.width//2, app.height//2 - 50,  align = 'center')
+    drawImage(getSprite('images/instructions (3).png'), app.width//2, app.height//2 - 100,  align = 'center')
+    drawImage(getSprite('images/instructions (4).png'), app.width//2, app.height//2 + 50,  align = 'center', height=45, width=app.width//2-50)
+    drawImage(getSprite('images/instructions (5).png'), app.width//2, app.height//2 + 100,  align = 'center', height=45, width=app.width//2-50)
 
 def drawNameEntry(app):
-    drawImage(loadImageFromStringReference('images/preview.png'), 0, 0, width=app.width, height=app.height)
+    drawImage(getSprite('images/preview.png'), 0, 0, width=app.width, height=app.height)
     drawRect(app.width//2, app.height//2, app.width//2, app.height//2, align = 'center', fill = 'white', border = 'black')
     drawLabel(app.playerName, app.width//2, app.height//2, size = 50, font = 'Cinzel', bold = True)
     drawLabel(app.nameInstructions, app.width//2, app.height//2 - 100, size = 50, font = 'Cinzel', bold = True)
@@ -988,458 +2213,371 @@ def drawPause(app):
     drawLabel('PAUSED', app.width//2, app.height//2, size = 50, fill = 'white', font = 'Cinzel', bold = True)
 
 def drawCollisionBox(app):
-    for demon in Demon.DEMON_LIST:
+    for demon in app.world.demons:
         drawRect(demon.x, demon.y, demon.width, demon.height, fill = None, border = 'black')
-    for bat in Bats.BATS_LIST:
+    for bat in app.world.bats:
         drawRect(bat.x, bat.y, bat.width, bat.height, fill = None, border = 'black')
     drawRect(app.player.x, app.player.y, app.player.width, app.player.height, fill=None, border = 'black')
 
 def drawPlayer(app):
-    frame0 = loadImageFromStringReference('images/player/frame_00.png')
-    frame1 = loadImageFromStringReference('images/player/frame_01.png')
-    frame2 = loadImageFromStringReference('images/player/frame_02.png')
-    frame3 = loadImageFromStringReference('images/player/frame_03.png')
-    frame4 = loadImageFromStringReference('images/player/frame_04.png')
-    frame5 = loadImageFromStringReference('images/player/frame_05.png')
-    frame6 = loadImageFromStringReference('images/player/frame_06.png')
-    frame7 = loadImageFromStringReference('images/player/frame_07.png')
-    frame8 = loadImageFromStringReference('images/player/frame_08.png')
-    frame9 = loadImageFromStringReference('images/player/frame_09.png')
-    frame10 = loadImageFromStringReference('images/player/frame_10.png')
-    frame11 = loadImageFromStringReference('images/player/frame_11.png')
-    if app.player.health > 0:
-        drawRect(app.player.x + app.player.width//2, app.player.y, 0.3*app.player.health, 3, fill = 'green', align = 'center', border = 'black', borderWidth=0.5)
-    if app.player.invincible:
-        if app.player.imageIndex == 0:
-            drawImage(frame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
-        elif app.player.imageIndex == 1:
-            drawImage(frame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-        elif app.player.imageIndex == 2:
-            drawImage(frame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-        elif app.player.imageIndex == 3:
-            drawImage(frame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-        elif app.player.imageIndex == 4:
-            drawImage(frame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-        elif app.player.imageIndex == 5:
-            drawImage(frame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-        elif app.player.imageIndex == 6:
-            drawImage(frame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-        elif app.player.imageIndex == 7:
-            drawImage(frame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-        elif app.player.imageIndex == 8:
-            drawImage(frame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-        elif app.player.imageIndex == 9:
-            drawImage(frame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-        elif app.player.imageIndex == 10:
-            drawImage(frame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-        elif app.player.imageIndex == 11:
-            drawImage(frame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
+    player = app.player
+    x, y = drawPosition(player, app)
+    if player.health > 0:
+        drawRect(x + player.width//2, y, 0.3*player.health, 3, fill = 'green', align = 'center', border = 'black', borderWidth=0.5)
+    if player.invincible:
+        image, opacity = animationFrame('player', 'invincible', 'right', player.imageIndex)
     else:
-        if app.player.hit:
-            drawCircle(app.player.x + app.player.width//2, app.player.y+app.player.height//2, app.player.width//2, fill = 'white', opacity = 70)
-        if app.player.imageIndex == 0:
-            drawImage(frame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 1:
-            drawImage(frame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 2:
-            drawImage(frame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 3:
-            drawImage(frame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 4:
-            drawImage(frame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 5:
-            drawImage(frame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 6:
-            drawImage(frame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 7:
-            drawImage(frame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 8:
-            drawImage(frame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 9:
-            drawImage(frame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 10:
-            drawImage(frame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        elif app.player.imageIndex == 11:
-            drawImage(frame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-    if app.player.doubleJump:
-        drawImage(loadImageFromStringReference('images/player/double-jump.png'), app.player.x + 10, app.player.y - app.player.height, width=40, height=40)
-    if app.player.statusEffect:
-        drawLabel(app.player.statusEffect, app.player.x + app.player.width//2, app.player.y + app.player.height, bold = True, size = 15)
+        if player.hit:
+            drawCircle(x + player.width//2, y+player.height//2, player.width//2, fill = 'white', opacity = 70)
+        image, opacity = animationFrame('player', 'run', 'right', player.imageIndex)
+    drawImage(image, x, y, width=player.width, height=player.height, opacity = opacity)
+    if player.doubleJump:
+        drawImage(getSprite('images/player/double-jump.png'), x + 10, y - player.height, width=40, height=40)
+    if player.statusEffect:
+        drawLabel(player.statusEffect, x + player.width//2, y + player.height, bold = True, size = 15)
 
 def drawPlayerForBosses(app):
-    idle = loadImageFromStringReference('images/player/idle0.png')
-    idleLeft = loadImageFromStringReference('images/player/idle1.png')
-    frame0 = loadImageFromStringReference('images/player/frame_00.png')
-    frame1 = loadImageFromStringReference('images/player/frame_01.png')
-    frame2 = loadImageFromStringReference('images/player/frame_02.png')
-    frame3 = loadImageFromStringReference('images/player/frame_03.png')
-    frame4 = loadImageFromStringReference('images/player/frame_04.png')
-    frame5 = loadImageFromStringReference('images/player/frame_05.png')
-    frame6 = loadImageFromStringReference('images/player/frame_06.png')
-    frame7 = loadImageFromStringReference('images/player/frame_07.png')
-    frame8 = loadImageFromStringReference('images/player/frame_08.png')
-    frame9 = loadImageFromStringReference('images/player/frame_09.png')
-    frame10 = loadImageFromStringReference('images/player/frame_10.png')
-    frame11 = loadImageFromStringReference('images/player/frame_11.png')
-    leftFrame0 = loadImageFromStringReference('images/player/runningLeft00.png')
-    leftFrame1 = loadImageFromStringReference('images/player/runningLeft01.png')
-    leftFrame2 = loadImageFromStringReference('images/player/runningLeft02.png')
-    leftFrame3 = loadImageFromStringReference('images/player/runningLeft03.png')
-    leftFrame4 = loadImageFromStringReference('images/player/runningLeft04.png')
-    leftFrame5 = loadImageFromStringReference('images/player/runningLeft05.png')
-    leftFrame6 = loadImageFromStringReference('images/player/runningLeft06.png')
-    leftFrame7 = loadImageFromStringReference('images/player/runningLeft07.png')
-    leftFrame8 = loadImageFromStringReference('images/player/runningLeft08.png')
-    leftFrame9 = loadImageFromStringReference('images/player/runningLeft09.png')
-    leftFrame10 = loadImageFromStringReference('images/player/runningLeft10.png')
-    leftFrame11 = loadImageFromStringReference('images/player/runningLeft11.png')
-    if app.player.health > 0:
-        drawRect(app.player.x + app.player.width//2, app.player.y, 0.3*app.player.health, 3, fill = 'green', align = 'center', border = 'black', borderWidth=0.5)
-    if not app.player.moving and not app.player.isJumping:
-        if app.player.hit:
-            drawCircle(app.player.x + app.player.width//2, app.player.y+app.player.height//2, app.player.width//2, fill = 'red', opacity = 50)
-        if not app.player.movingLeft:
-            drawImage(idle, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        else:
-            drawImage(idleLeft, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-    elif app.player.invincible:
-        if not app.player.movingLeft:
-            if app.player.imageIndex == 0:
-                drawImage(frame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
-            elif app.player.imageIndex == 1:
-                drawImage(frame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-            elif app.player.imageIndex == 2:
-                drawImage(frame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 3:
-                drawImage(frame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 4:
-                drawImage(frame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-            elif app.player.imageIndex == 5:
-                drawImage(frame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-            elif app.player.imageIndex == 6:
-                drawImage(frame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-            elif app.player.imageIndex == 7:
-                drawImage(frame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-            elif app.player.imageIndex == 8:
-                drawImage(frame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 9:
-                drawImage(frame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 10:
-                drawImage(frame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-            elif app.player.imageIndex == 11:
-                drawImage(frame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
-        else:
-            if app.player.imageIndex == 0:
-                drawImage(leftFrame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
-            elif app.player.imageIndex == 1:
-                drawImage(leftFrame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-            elif app.player.imageIndex == 2:
-                drawImage(leftFrame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 3:
-                drawImage(leftFrame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 4:
-                drawImage(leftFrame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-            elif app.player.imageIndex == 5:
-                drawImage(leftFrame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-            elif app.player.imageIndex == 6:
-                drawImage(leftFrame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 50)
-            elif app.player.imageIndex == 7:
-                drawImage(leftFrame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 70)
-            elif app.player.imageIndex == 8:
-                drawImage(leftFrame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 9:
-                drawImage(leftFrame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 80)
-            elif app.player.imageIndex == 10:
-                drawImage(leftFrame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 90)
-            elif app.player.imageIndex == 11:
-                drawImage(leftFrame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height, opacity = 100)
+    player = app.player
+    x, y = drawPosition(player, app)
+    if player.health > 0:
+        drawRect(x + player.width//2, y, 0.3*player.health, 3, fill = 'green', align = 'center', border = 'black', borderWidth=0.5)
+    facing = 'left' if player.movingLeft else 'right'
+    if not player.moving and not player.isJumping:
+        state = 'idle'
+    elif player.invincible:
+        state = 'invincible'
     else:
-        if app.player.hit:
-            drawCircle(app.player.x + app.player.width//2, app.player.y+app.player.height//2, app.player.width//2, fill = 'red', opacity = 50)
-        if not app.player.movingLeft:
-            if app.player.imageIndex == 0:
-                drawImage(frame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 1:
-                drawImage(frame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 2:
-                drawImage(frame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 3:
-                drawImage(frame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 4:
-                drawImage(frame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 5:
-                drawImage(frame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 6:
-                drawImage(frame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 7:
-                drawImage(frame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 8:
-                drawImage(frame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 9:
-                drawImage(frame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 10:
-                drawImage(frame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 11:
-                drawImage(frame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-        else:
-            if app.player.imageIndex == 0:
-                drawImage(leftFrame0, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 1:
-                drawImage(leftFrame1, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 2:
-                drawImage(leftFrame2, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 3:
-                drawImage(leftFrame3, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 4:
-                drawImage(leftFrame4, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 5:
-                drawImage(leftFrame5, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 6:
-                drawImage(leftFrame6, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 7:
-                drawImage(leftFrame7, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 8:
-                drawImage(leftFrame8, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 9:
-                drawImage(leftFrame9, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 10:
-                drawImage(leftFrame10, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-            elif app.player.imageIndex == 11:
-                drawImage(leftFrame11, app.player.x, app.player.y, width=app.player.width, height=app.player.height)
-    if app.player.doubleJump:
-        drawImage(loadImageFromStringReference('images/player/double-jump.png'), app.player.x + 10, app.player.y - app.player.height, width=40, height=40)
+        state = 'run'
+    if player.hit and state != 'invincible':
+        drawCircle(x + player.width//2, y+player.height//2, player.width//2, fill = 'red', opacity = 50)
+    image, opacity = animationFrame('player', state, facing, player.imageIndex)
+    drawImage(image, x, y, width=player.width, height=player.height, opacity = opacity)
+    if player.doubleJump:
+        drawImage(getSprite('images/player/double-jump.png'), x + 10, y - player.height, width=40, height=40)
 
 def drawPlayerAttackCooldown(app):
-    drawRect(app.player.x + app.player.width//2, app.player.y - 20, 31 - (app.player.attackCooldown), 4, fill = 'blue', align = 'center', border = 'black', borderWidth=0.5)
+    x, y = drawPosition(app.player, app)
+    drawRect(x + app.player.width//2, y - 20, 31 - (app.player.attackCooldown), 4, fill = 'blue', align = 'center', border = 'black', borderWidth=0.5)
 
 def drawTerrain(app):
-    for index in range(len(Terrain.TERRAIN_HEIGHTS) - 1):
-        height = Terrain.TERRAIN_HEIGHTS[index]
-        nextHeight = Terrain.TERRAIN_HEIGHTS[index+1]
-        drawPolygon(index * app.width//33, height, (index+1) * app.width//33, nextHeight, (index+1) * app.width//33, app.height, index * app.width//33, app.height)
+    if len(app.world.terrainHeights) > 1:
+        points = terrainOutline(app)
+        if not app.bossMode and app.alpha < 1: #the ground moved one column last tick, slide it part of the way
+            column = app.width//33
+            shift = (1 - app.alpha) * column
+            popped = app.world.poppedHeight if app.world.poppedHeight != None else points[1]
+            left = shift - column #the popped column goes back in front so the ground still reaches x=0
+            points = ([left, popped] + [value + shift if index % 2 == 0 else value for (index, value) in enumerate(points[:-2])]
+                      + [left, app.height])
+        drawPolygon(*points) #one draw call for the whole ground instead of one per column
+
+def terrainOutline(app):
+    #points along the tops of the columns then down to the bottom corners, only rebuilt when columns scroll in or out
+    heights = app.world.terrainHeights
+    key = (id(heights), heights.offset, len(heights), app.width, app.height)
+    if key != app.world.outlineKey:
+        points = []
+        for index, height in enumerate(heights):
+            points += [index * app.width//33, height]
+        points += [(len(heights) - 1) * app.width//33, app.height, 0, app.height]
+        app.world.outline = points
+        app.world.outlineKey = key
+    return app.world.outline
 
 def drawCacti(app):
-    for cactus in Cacti.CACTI_LOCATIONS:
-        image = loadImageFromStringReference('images/cactus.png')
-        drawImage(image, cactus.x, cactus.y, width=cactus.width, height=cactus.height)
+    image = getSprite('images/cactus.png')
+    for cactus in app.world.cacti:
+        x, y = drawPosition(cactus, app)
+        drawImage(image, x, y, width=cactus.width, height=cactus.height)
+
+def bossAnimation(boss, app):
+    #facing is the way the boss is looking, the sprite file names don't always agree
+    if boss.type == 'ogre':
+        if boss.xVel > 0:
+            return ('ogre', 'walk', 'right')
+        elif boss.xVel < 0:
+            return ('ogre', 'walk', 'left')
+    elif boss.type == 'werewolf':
+        if boss.x == 0 or boss.x == app.width - boss.width:
+            if boss.imageIndexType == 'idle' or boss.imageIndexType == 'charging':
+                facing = 'right' if checkObjectLeftOrRight(boss, app.player) == 'left' else 'left'
+                return ('werewolf', boss.imageIndexType, facing)
+        elif boss.xVel > 1:
+            return ('werewolf', 'run', 'right')
+        elif boss.xVel < -1:
+            return ('werewolf', 'run', 'left')
+    return None
 
 def drawBoss(app):
-    for boss in Boss.BOSSES:
-        drawRect(boss.x + boss.width//2, boss.y, 0.01 + 0.3 * boss.health, 3, fill = 'red', align = 'center')
-        if boss.type == 'ogre':
-            if boss.xVel > 0:
-                if boss.imageIndex == 0:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 1:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 2:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 3:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 4:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 5:
-                    drawImage(loadImageFromStringReference('images/enemies/ogre5.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-            elif boss.xVel < 0:
-                if boss.imageIndex == 0:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 1:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 2:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 3:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 4:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 5:
-                    drawImage(loadImageFromStringReference('images/enemies/ogreRight5.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-
-
-        elif boss.type == 'werewolf':
-            if boss.x == 0 or boss.x == app.width - boss.width:
-                if boss.imageIndexType == 'idle':
-                    if checkObjectLeftOrRight(boss, app.player) == 'left':
-                        if boss.imageIndex == 0:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 1:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 2:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 3:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 4:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 5:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleright4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                    elif checkObjectLeftOrRight(boss, app.player) == 'right':
-                        if boss.imageIndex == 0:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 1:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 2:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 3:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 4:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 5:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfidleleft4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                elif boss.imageIndexType == 'charging':
-                    if checkObjectLeftOrRight(boss, app.player) == 'left':
-                        if boss.imageIndex == 0:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 1:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 2:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 3:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 4:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 5:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeRight4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                    elif checkObjectLeftOrRight(boss, app.player) == 'right':
-                        if boss.imageIndex == 0:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 1:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 2:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 3:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 4:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                        if boss.imageIndex == 5:
-                            drawImage(loadImageFromStringReference('images/enemies/werewolfChargeLeft4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-            elif boss.xVel > 1:
-                if boss.imageIndex == 0:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 1:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 2:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 3:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 4:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 5:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfleft5.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-            elif boss.xVel < -1:
-                if boss.imageIndex == 0:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright0.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 1:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright1.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 2:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright2.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 3:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright3.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 4:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright4.png'), boss.x, boss.y, width=boss.width, height=boss.height)
-                if boss.imageIndex == 5:
-                    drawImage(loadImageFromStringReference('images/enemies/werewolfright5.png'), boss.x, boss.y, width=boss.width, height=boss.height)
+    for boss in app.world.bosses:
+        x, y = drawPosition(boss, app)
+        drawRect(x + boss.width//2, y, 0.01 + 0.3 * boss.health, 3, fill = 'red', align = 'center')
+        animation = bossAnimation(boss, app)
+        if animation != None:
+            image, opacity = animationFrame(*animation, boss.imageIndex)
+            drawImage(image, x, y, width=boss.width, height=boss.height, opacity = opacity)
 
 def drawHeroProjectile(app):
-    for projectile in HeroProjectile.PROJECTILES:
-        if projectile.imageIndex == 0:
-            drawImage(loadImageFromStringReference('images/player/energyball0.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-        elif projectile.imageIndex == 1:
-            drawImage(loadImageFromStringReference('images/player/energyball1.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-        elif projectile.imageIndex == 2:
-            drawImage(loadImageFromStringReference('images/player/energyball2.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-
+    for projectile in app.world.heroProjectiles:
+        image, opacity = animationFrame('energyball', None, None, projectile.imageIndex)
+        x, y = drawPosition(projectile, app)
+        drawImage(image, x, y, width=projectile.width + 10, height=projectile.height + 10, opacity = opacity)
 
 def drawEnemyProjectile(app):
-    for projectile in EnemyProjectile.PROJECTILES:
-        if projectile.type == 'fireball':
-            if projectile.imageIndex == 0:
-                drawImage(loadImageFromStringReference('images/enemies/fireball0.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 1:
-                drawImage(loadImageFromStringReference('images/enemies/fireball1.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 2:
-                drawImage(loadImageFromStringReference('images/enemies/fireball2.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-        elif projectile.type == 'iceball':
-            if projectile.imageIndex == 0:
-                drawImage(loadImageFromStringReference('images/enemies/iceball0.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 1:
-                drawImage(loadImageFromStringReference('images/enemies/iceball1.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 2:
-                drawImage(loadImageFromStringReference('images/enemies/iceball2.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-        elif projectile.type == 'rock':
-            if projectile.imageIndex == 0:
-                drawImage(loadImageFromStringReference('images/enemies/rock0.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 1:
-                drawImage(loadImageFromStringReference('images/enemies/rock1.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
-            elif projectile.imageIndex == 2:
-                drawImage(loadImageFromStringReference('images/enemies/rock2.png'), projectile.x, projectile.y, width=projectile.width + 10, height=projectile.height + 10)
+    for projectile in app.world.enemyProjectiles:
+        image, opacity = animationFrame(projectile.type, None, None, projectile.imageIndex)
+        x, y = drawPosition(projectile, app)
+        drawImage(image, x, y, width=projectile.width + 10, height=projectile.height + 10, opacity = opacity)
 
 def drawBats(app):
-    for bat in Bats.BATS_LIST:
-        bat1 = loadImageFromStringReference('images/enemies/bat1.png')
-        bat2 = loadImageFromStringReference('images/enemies/bat2.png')
-        if bat.imageIndex % 4 == 0:
-            drawImage(bat1, bat.x, bat.y, width=bat.width, height=bat.height)
-        if bat.imageIndex % 4 == 1:
-            drawImage(bat1, bat.x, bat.y, width=bat.width, height=bat.height)
-        if bat.imageIndex % 4 == 2:
-            drawImage(bat2, bat.x, bat.y, width=bat.width, height=bat.height)
-        if bat.imageIndex % 4 == 3:
-            drawImage(bat2, bat.x, bat.y, width=bat.width, height=bat.height)
+    for bat in app.world.bats:
+        image, opacity = animationFrame('bat', None, None, bat.imageIndex)
+        x, y = drawPosition(bat, app)
+        drawImage(image, x, y, width=bat.width, height=bat.height, opacity = opacity)
 
 def drawDemons(app):
-    for demon in Demon.DEMON_LIST:
-        if demon.imageIndex % 6 == 0:
-            drawImage(loadImageFromStringReference('images/enemies/demon0.png'), demon.x, demon.y, width=demon.width, height=demon.height)
-        if demon.imageIndex % 6 == 1:
-            drawImage(loadImageFromStringReference('images/enemies/demon1.png'), demon.x, demon.y, width=demon.width, height=demon.height)
-        if demon.imageIndex % 6 == 2:
-            drawImage(loadImageFromStringReference('images/enemies/demon2.png'), demon.x, demon.y, width=demon.width, height=demon.height)
-        if demon.imageIndex % 6 == 3:
-            drawImage(loadImageFromStringReference('images/enemies/demon3.png'), demon.x, demon.y, width=demon.width, height=demon.height)
-        if demon.imageIndex % 6 == 4:
-            drawImage(loadImageFromStringReference('images/enemies/demon4.png'), demon.x, demon.y, width=demon.width, height=demon.height)
-        if demon.imageIndex % 6 == 5:
-            drawImage(loadImageFromStringReference('images/enemies/demon5.png'), demon.x, demon.y, width=demon.width, height=demon.height)
+    for demon in app.world.demons:
+        image, opacity = animationFrame('demon', None, None, demon.imageIndex)
+        x, y = drawPosition(demon, app)
+        drawImage(image, x, y, width=demon.width, height=demon.height, opacity = opacity)
 
 def drawPowerups(app):
-    for doubleJump in DoubleJump.DOUBLE_JUMP_LOCATIONS:
-        boots = loadImageFromStringReference('images/player/double-jump.png')
-        drawImage(boots, doubleJump.x, doubleJump.y, width=doubleJump.width, height=doubleJump.height)
-    for invincibility in Invincibility.INVINCIBLE_LOCATIONS:
-        star = loadImageFromStringReference('images/player/invincibility.png')
-        drawImage(star, invincibility.x, invincibility.y, width=invincibility.width, height=invincibility.height)
-    for potion in Potion.POTION_LOCATIONS:
-        health = loadImageFromStringReference('images/player/potion.png')
-        drawImage(health, potion.x, potion.y, width=potion.width, height=potion.height)
+    for (path, collectibles) in [('images/player/double-jump.png', app.world.doubleJumps),
+                                 ('images/player/invincibility.png', app.world.invincibles),
+                                 ('images/player/potion.png', app.world.potions)]:
+        image = getSprite(path)
+        for collectible in collectibles:
+            x, y = drawPosition(collectible, app)
+            drawImage(image, x, y, width=collectible.width, height=collectible.height)
 
 def drawPowerupTimer(app):
-    if app.player.doubleJump:
-        drawLabel(app.player.powerupTime, app.width//2, app.height - 0.85*(app.height))
+    #one line per running effect under the time, counting down to the tick it expires on
+    for index, (name, (value, seconds)) in enumerate(sorted(activeEffects(app).items())):
+        label = value if name == 'statusEffect' else Player.EFFECT_LABELS[name]
+        drawLabel(f'{label}: {math.ceil(seconds)}', app.width//2, app.height - 0.85*(app.height) + 25*index, bold = True, size = 16, font = 'Caveat')
+
+#One parallax layer: speed is how fast it scrolls compared to the ground, every is how many ticks it holds still between moves
+class BackgroundLayer:
+    def __init__(self, path, speed, every=1, enabled=True):
+        self.path = path
+        self.speed = speed
+        self.every = every
+        self.enabled = enabled
+        self.strip = None #scaled to the window once and put side by side twice, so one draw call covers the screen
+        self.image = None
+        self.size = None
+
+    def scaledStrip(self, app):
+        if self.size != (app.width, app.height):
+            image = PILImage.open(self.path).convert('RGBA').resize((app.width, app.height))
+            self.strip = PILImage.new('RGBA', (2 * app.width, app.height))
+            self.strip.paste(image, (0, 0))
+            self.strip.paste(image, (app.width, 0))
+            self.size = (app.width, app.height)
+        return self.strip
+
+    def stripImage(self, app):
+        if self.image == None or self.size != (app.width, app.height):
+            self.image = CMUImage(self.scaledStrip(app))
+        return self.image
+
+#Farthest layer first. Turn layers off or raise every to trade detail for frame time on slow machines
+#layers at the back that never move (speed 0) are merged into one picture, moving layers each draw their prerendered strip
+class Background:
+    LAYERS = [BackgroundLayer('images/background/sky.png', 0.1, every = 4),
+              BackgroundLayer('images/background/clouds.png', 0.3, every = 2),
+              BackgroundLayer('images/background/far-mountains.png', 0.5),
+              BackgroundLayer('images/background/canyon.png', 1)]
+    MERGE_STATIC = True
+    MERGED = None
+    MERGED_KEY = None
+
+def moveBackground(app):
+    for index, layer in enumerate(Background.LAYERS):
+        if app.timer % layer.every == 0:
+            app.backgroundMoves[index] = (app.backgroundOffsets[index], app.timer)
+            app.backgroundOffsets[index] = int(layer.speed * app.scroll) % app.width
+
+def staticLayers():
+    count = 0
+    if PILImage != None and Background.MERGE_STATIC:
+        while count < len(Background.LAYERS) and Background.LAYERS[count].speed == 0:
+            count += 1
+    return count if count > 1 else 0 #merging a single layer wouldn't save a draw call
+
+def mergedStaticLayers(count, app):
+    #only rebuilt when the window size or the enabled layers change, cmu_graphics keeps every CMUImage it is given
+    layers = [layer for layer in Background.LAYERS[:count] if layer.enabled]
+    key = (tuple(layers), app.width, app.height)
+    if key != Background.MERGED_KEY:
+        merged = PILImage.new('RGBA', (app.width, app.height))
+        for layer in layers:
+            merged.alpha_composite(layer.scaledStrip(app).crop((0, 0, app.width, app.height)))
+        Background.MERGED = CMUImage(merged)
+        Background.MERGED_KEY = key
+    return Background.MERGED
+
+def drawnOffset(index, app):
+    #slides from the layer's last offset to its current one over the ticks until it moves again, like drawPosition for entities
+    offset = app.backgroundOffsets[index]
+    if app.bossMode or app.alpha >= 1:
+        return offset
+    previous, moved = app.backgroundMoves[index]
+    progress = min(1, (app.timer - moved + app.alpha) / Background.LAYERS[index].every)
+    return (previous + (offset - previous) % app.width * progress) % app.width
 
 def drawBackground(app):
-    # Load images for layers
-    layer1 = loadImageFromStringReference('images/background/sky.png')  # Farthest
-    layer2 = loadImageFromStringReference('images/background/clouds.png')
-    layer3 = loadImageFromStringReference('images/background/far-mountains.png')
-    layer4 = loadImageFromStringReference('images/background/canyon.png')  # Closest
-    
-    # Draw each layer with parallax effect
-    # Background layers move at different speeds
-    drawImage(layer1, app.backgroundX - (0.1 * app.scroll1), app.backgroundY, width=app.width, height=app.height, align='top-right')  # Slowest
-    drawImage(layer1, app.backgroundX + app.width - (0.1 * app.scroll1), app.backgroundY, width=app.width, height=app.height, align='top-right') 
-    drawImage(layer2, app.backgroundX - (0.3* app.scroll2), app.backgroundY, width=app.width, height=app.height,  align='top-right')
-    drawImage(layer2, app.backgroundX + app.width - (0.3* app.scroll2), app.backgroundY, width=app.width, height=app.height,  align='top-right')
-    drawImage(layer3, app.backgroundX - (0.5 * app.scroll3), app.backgroundY, width=app.width, height=app.height,  align='top-right')
-    drawImage(layer3, app.backgroundX + app.width - (0.5 * app.scroll3), app.backgroundY, width=app.width, height=app.height,  align='top-right')
-    drawImage(layer4, app.backgroundX - app.scroll4, app.backgroundY, width=app.width, height=app.height,  align='top-right')  
-    drawImage(layer4, app.backgroundX + app.width - 1 - (app.scroll4), app.backgroundY, width=app.width, height=app.height,  align='top-right')  # Fastest
+    merged = staticLayers()
+    if merged > 0:
+        drawImage(mergedStaticLayers(merged, app), 0, app.backgroundY)
+    for index in range(merged, len(Background.LAYERS)):
+        layer = Background.LAYERS[index]
+        offset = drawnOffset(index, app)
+        if not layer.enabled:
+            continue
+        if PILImage != None:
+            drawImage(layer.stripImage(app), -offset, app.backgroundY)
+        else:
+            image = getSprite(layer.path)
+            drawImage(image, -offset, app.backgroundY, width=app.width, height=app.height)
+            if offset > 0: #second tile is only on screen once the first has started sliding off
+                drawImage(image, app.width - offset, app.backgroundY, width=app.width, height=app.height)
 
 def drawScoreAndTimer(app):
     drawLabel(f'SCORE: {app.player.score}', app.width//2, app.height - 0.9*(app.height), bold = True, size = 20, font = 'Caveat')
     drawLabel(f'TIME: {math.floor(app.seconds)}', app.width//2, app.height - 0.95*(app.height), bold = True, size = 20, font = 'Caveat')
 
 
-def main():
-    runApp()
+####################################################################################################################################################
+####################################################################################################################################################
+
+#Headless simulation (no window), runs ticks back to back as fast as possible
+class HeadlessApp:
+    def __init__(self, seed=None):
+        resetApp(self, seed)
+        self.mode = 'game'
+        self.playerName = 'headless'
+        self.scoreFile = None #don't write simulated games to the high score file
+        self.interpolate = False #nothing is drawn
+
+def parseInputScript(script):
+    #'5:up 10:space 20-60:right' presses up at tick 5, space at tick 10 and holds right from tick 20 to 60
+    presses = {}
+    holds = []
+    for token in script.replace(',', ' ').split():
+        ticks, key = token.split(':')
+        if '-' in ticks:
+            start, end = ticks.split('-')
+            holds.append((int(start), int(end), key))
+        else:
+            presses.setdefault(int(ticks), []).append(key)
+    return presses, holds
+
+def headlessTick(app, pressed, keys):
+    #one tick of input and simulation without a frame loop around it
+    for key in pressed:
+        onKeyPress(app, key)
+    if keys:
+        onKeyHold(app, keys)
+    simulateTick(app)
+    app.heldKeys = set()
+
+def scriptedPolicy(script):
+    #a policy maps (app, tick) to the keys pressed and the keys held on that tick
+    presses, holds = parseInputScript(script)
+    def policy(app, tick):
+        return presses.get(tick, []), {key for (first, last, key) in holds if first <= tick <= last}
+    return policy
+
+def runHeadless(ticks, seed=None, script='', arrays=False, policy=None):
+    random.seed(seed) #seeds for later restarts come from here
+    useEntityArrays(arrays)
+    app = HeadlessApp(seed)
+    if policy == None:
+        policy = scriptedPolicy(script)
+    start = time.perf_counter()
+    tick = 0
+    while tick < ticks and not app.gameOver:
+        headlessTick(app, *policy(app, tick))
+        tick += 1
+    elapsed = time.perf_counter() - start
+    prefetcher = app.world.prefetcher
+    app.prefetchStats = None if prefetcher == None else prefetcher.stats() #read before close, which takes a chunk off the queue
+    app.world.close() #stops the prefetch thread, callers only look at the results
+    return app, tick, elapsed
+
+def importTimes(code):
+    #runs code in a fresh interpreter with -X importtime, returns ({module: cumulative ms}, None) or (None, what it printed) if it failed
+    import subprocess
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return None, '\n'.join(line for line in result.stderr.splitlines() if not line.startswith('import time:'))
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative) / 1000
+    return times, None
+
+def measureImportTime(budget=None):
+    times, error = importTimes('import main')
+    if times == None:
+        print('import main failed:')
+        print(error)
+        return 1
+    total = times.get('main', 0)
+    print(f'import main: {total:.1f}ms')
+    for module, ms in sorted(times.items(), key=lambda item: -item[1])[1:6]:
+        print(f'  {module:30} {ms:7.1f}ms')
+    graphics, error = importTimes('import main; main.loadGraphics()')
+    if graphics != None:
+        print(f"loadGraphics: cmu_graphics {graphics['cmu_graphics']:.1f}ms, PIL {graphics.get('PIL.Image', 0):.1f}ms")
+    else:
+        print('loadGraphics: cmu_graphics not installed')
+    if budget != None and total > budget:
+        print(f'over the {budget:g}ms budget')
+        return 1
+    return 0
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Fantasy Runner 112')
+    parser.add_argument('--headless', action='store_true', help='simulate without opening a window')
+    parser.add_argument('--ticks', type=int, default=10000, help='number of ticks to simulate')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the run')
+    parser.add_argument('--arrays', action='store_true', help='keep entities in the NumPy array store')
+    parser.add_argument('--fps', type=int, default=Clock.FRAME_RATE, help='how often the window draws, the game itself always runs at 20 ticks per second')
+    parser.add_argument('--no-prefetch', action='store_true', help='generate terrain chunks on the tick instead of a worker thread')
+    parser.add_argument('--rewind', type=float, default=0, help="keep snapshots of the last this many seconds, 'z' rewinds one second")
+    parser.add_argument('--profile', default=None, help='record per subsystem timings and write them to this .json or .csv file on exit')
+    parser.add_argument('--import-time', action='store_true', help='report how long importing main takes in a fresh interpreter, with and without the graphics')
+    parser.add_argument('--import-budget', type=float, default=None, help='with --import-time, exit with an error if importing main takes longer than this many ms')
+    parser.add_argument('--inputs', default='', help="scripted input like '5:up 10:space 20-60:right', or @file to read it from a file")
+    args = parser.parse_args(argv)
+    if args.profile != None:
+        enableProfiler(args.profile)
+    TerrainPrefetcher.ENABLED = not args.no_prefetch
+    Snapshots.REWIND_SECONDS = args.rewind
+    Clock.FRAME_RATE = args.fps
+    if args.import_time:
+        sys.exit(measureImportTime(args.import_budget))
+    if not args.headless:
+        loadGraphics()
+        runApp()
+        return
+    script = args.inputs
+    if script.startswith('@'):
+        with open(script[1:], 'r') as file:
+            script = file.read()
+    app, ticks, elapsed = runHeadless(args.ticks, args.seed, script, args.arrays)
+    print(f'{ticks} ticks in {elapsed:.3f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s)')
+    print(f'seed: {app.seed}  score: {app.player.score}  time: {math.floor(app.seconds)}  health: {app.player.health}  gameOver: {app.gameOver}')
+    if app.prefetchStats != None:
+        print('terrain prefetch:', app.prefetchStats)
+    if app.snapshots != None:
+        print('snapshots:', app.snapshots.stats(), snapshotStats())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file